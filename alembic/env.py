@@ -7,6 +7,7 @@ from sqlalchemy import engine_from_config, pool
 from alembic import context
 from logstack.database import get_url
 from logstack.database_models import Base
+from logstack.partitions import is_partition
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -21,6 +22,11 @@ fileConfig(config.config_file_name)
 target_metadata = Base.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # the flamechart partitions are managed by logstack.partitions
+    return not (type_ == "table" and is_partition(name))
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -37,6 +43,7 @@ def run_migrations_offline():
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         compare_type=True,
     )
@@ -64,6 +71,7 @@ def run_migrations_online():
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
+            include_object=include_object,
             compare_type=True,
         )
 
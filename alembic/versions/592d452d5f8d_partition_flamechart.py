@@ -0,0 +1,132 @@
+"""partition flamechart
+
+Revision ID: 592d452d5f8d
+Revises: efe91faf2d82
+Create Date: 2026-10-18 06:10:05.380351
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "592d452d5f8d"
+down_revision = "efe91faf2d82"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, filename, upload_uuid, prefix_id, error_count, environment, "
+    "from_date, to_date, created_at"
+)
+INDEXED = [
+    "id",
+    "filename",
+    "upload_uuid",
+    "prefix_id",
+    "from_date",
+    "to_date",
+    "created_at",
+]
+
+
+def create_flamechart(primary_key, **kwargs):
+    op.create_table(
+        "flamechart",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("upload_uuid", sa.UUID(), nullable=False),
+        sa.Column("prefix_id", sa.Integer(), nullable=False),
+        sa.Column("error_count", sa.Integer(), nullable=False),
+        sa.Column("environment", sa.String(), nullable=True),
+        sa.Column("from_date", sa.DateTime(), nullable=False),
+        sa.Column("to_date", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["prefix_id"],
+            ["prefix.id"],
+        ),
+        primary_key,
+        **kwargs,
+    )
+
+
+def retire_flamechart(old_name):
+    """Rename flamechart and free the names of its sequence, constraints and
+    indexes for the table that replaces it.
+    """
+    op.rename_table("flamechart", old_name)
+    op.execute(f"ALTER SEQUENCE flamechart_id_seq RENAME TO {old_name}_id_seq")
+    op.execute(f"ALTER TABLE {old_name} DROP CONSTRAINT flamechart_pkey")
+    op.execute(f"ALTER TABLE {old_name} DROP CONSTRAINT flamechart_prefix_id_fkey")
+    for column in INDEXED:
+        op.drop_index(f"ix_flamechart_{column}", table_name=old_name)
+
+
+def copy_flamechart(old_name):
+    """Copy the rows and the id sequence of `old_name` into flamechart, drop
+    it and index flamechart.
+    """
+    op.execute(f"INSERT INTO flamechart ({COLUMNS}) SELECT {COLUMNS} FROM {old_name}")
+    op.execute(
+        f"""
+        SELECT setval('flamechart_id_seq', last_value, is_called)
+        FROM {old_name}_id_seq
+        """,
+    )
+    op.drop_table(old_name)
+    for column in INDEXED:
+        op.create_index(
+            op.f(f"ix_flamechart_{column}"),
+            "flamechart",
+            [column],
+            unique=False,
+        )
+
+
+def upgrade():
+    retire_flamechart("flamechart_unpartitioned")
+    create_flamechart(
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    # monthly partitions for the existing rows, the current month and the next
+    # one, named like partitions.partition_name
+    bounds = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                """
+            SELECT month::date, (month + interval '1 month')::date
+            FROM (
+                SELECT generate_series(
+                    date_trunc(
+                        'month',
+                        least(min(created_at), now() AT TIME ZONE 'utc')
+                    ),
+                    date_trunc(
+                        'month',
+                        greatest(max(created_at), now() AT TIME ZONE 'utc')
+                    ) + interval '1 month',
+                    interval '1 month'
+                ) AS month
+                FROM flamechart_unpartitioned
+            ) AS months
+            """,
+            ),
+        )
+        .all()
+    )
+    for lower, upper in bounds:
+        op.execute(
+            f"CREATE TABLE flamechart_p{lower:%Y_%m} PARTITION OF flamechart "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')",
+        )
+    copy_flamechart("flamechart_unpartitioned")
+
+
+def downgrade():
+    retire_flamechart("flamechart_partitioned")
+    create_flamechart(sa.PrimaryKeyConstraint("id"))
+    copy_flamechart("flamechart_partitioned")
@@ -0,0 +1,25 @@
+"""add data version
+
+Revision ID: 62bc328edda8
+Revises: bed52ace18b3
+Create Date: 2026-10-18 05:53:14.085935
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "62bc328edda8"
+down_revision = "bed52ace18b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(sa.schema.CreateSequence(sa.Sequence("data_version")))
+
+
+def downgrade():
+    op.execute(sa.schema.DropSequence(sa.Sequence("data_version")))
@@ -0,0 +1,115 @@
+"""Add prefix table
+
+Revision ID: fc996fd9c04f
+Revises: d423102df91f
+Create Date: 2026-10-18 05:12:05.598107
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "fc996fd9c04f"
+down_revision = "d423102df91f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "prefix",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.Column("parent_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["parent_id"], ["prefix.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("path"),
+    )
+    op.create_index(
+        op.f("ix_prefix_parent_id"),
+        "prefix",
+        ["parent_id"],
+        unique=False,
+    )
+
+    # every stored path and all of its ancestors, see prefixes.ancestor_paths
+    op.execute(
+        """
+        INSERT INTO prefix (path, depth)
+        SELECT DISTINCT
+            array_to_string(parts[1:n], '/'),
+            n - CASE WHEN parts[1] = '' AND n > 1 THEN 2 ELSE 1 END
+        FROM (SELECT DISTINCT string_to_array(prefix, '/') AS parts FROM flamechart)
+            AS paths,
+            generate_series(1, cardinality(parts)) AS n
+        WHERE array_to_string(parts[1:n], '/') <> ''
+        UNION
+        SELECT '', 0 WHERE EXISTS (SELECT 1 FROM flamechart WHERE prefix = '')
+        """,
+    )
+    op.execute(
+        """
+        UPDATE prefix AS child
+        SET parent_id = parent.id
+        FROM prefix AS parent
+        WHERE child.depth > 0
+            AND parent.path = regexp_replace(child.path, '/[^/]*$', '')
+        """,
+    )
+
+    op.add_column("flamechart", sa.Column("prefix_id", sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE flamechart
+        SET prefix_id = prefix.id
+        FROM prefix
+        WHERE prefix.path = flamechart.prefix
+        """,
+    )
+    op.alter_column("flamechart", "prefix_id", nullable=False)
+    op.create_index(
+        op.f("ix_flamechart_prefix_id"),
+        "flamechart",
+        ["prefix_id"],
+        unique=False,
+    )
+    op.create_foreign_key(
+        "flamechart_prefix_id_fkey",
+        "flamechart",
+        "prefix",
+        ["prefix_id"],
+        ["id"],
+    )
+    op.drop_index(op.f("ix_flamechart_prefix"), table_name="flamechart")
+    op.drop_column("flamechart", "prefix")
+
+
+def downgrade():
+    op.add_column("flamechart", sa.Column("prefix", sa.VARCHAR(), nullable=True))
+    op.execute(
+        """
+        UPDATE flamechart
+        SET prefix = prefix.path
+        FROM prefix
+        WHERE prefix.id = flamechart.prefix_id
+        """,
+    )
+    op.alter_column("flamechart", "prefix", nullable=False)
+    op.create_index(
+        op.f("ix_flamechart_prefix"),
+        "flamechart",
+        ["prefix"],
+        unique=False,
+    )
+    op.drop_constraint(
+        "flamechart_prefix_id_fkey",
+        "flamechart",
+        type_="foreignkey",
+    )
+    op.drop_index(op.f("ix_flamechart_prefix_id"), table_name="flamechart")
+    op.drop_column("flamechart", "prefix_id")
+    op.drop_index(op.f("ix_prefix_parent_id"), table_name="prefix")
+    op.drop_table("prefix")
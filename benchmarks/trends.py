@@ -0,0 +1,101 @@
+"""Compare the vectorized trend engine with the per-group polyfit loop.
+
+Run it as a module from the repository root, so logstack can be imported:
+
+    python -m benchmarks.trends [--prefixes 200000] [--points 8]
+"""
+
+import argparse
+import datetime
+import time
+from itertools import groupby
+from types import SimpleNamespace
+
+import numpy as np
+
+from logstack.trends import calculate_trends, group_trends
+
+
+def polyfit_trends(rows, group_by, sorting_key):
+    """The previous implementation, one np.polyfit call per group."""
+    trends = []
+    for group_by_key, group in groupby(rows, key=lambda r: getattr(r, group_by)):
+        recs = sorted(group, key=lambda row: getattr(row, sorting_key))
+        if len(recs) < 2:
+            trends.append((group_by_key, (1, 0)))
+            continue
+
+        x_values = np.array([i for i in range(len(recs))])
+        errors = np.array([r.error_count for r in recs])
+        k, b = np.polyfit(x_values, errors, 1)
+        trends.append((group_by_key, (k, b)))
+
+    return trends
+
+
+def make_rows(prefixes: int, points: int, seed: int = 0) -> list[SimpleNamespace]:
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2025, 1, 1)
+    sizes = rng.integers(1, 2 * points, prefixes)
+    rows = []
+    for prefix, size in enumerate(sizes):
+        days = rng.permutation(size)
+        errors = rng.integers(0, 10_000, size)
+        for day, error_count in zip(days.tolist(), errors.tolist()):
+            rows.append(
+                SimpleNamespace(
+                    prefix=f"/service/handler/{prefix}",
+                    created_at=start + datetime.timedelta(days=day),
+                    error_count=error_count,
+                ),
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prefixes", type=int, default=200_000)
+    parser.add_argument("--points", type=int, default=8)
+    args = parser.parse_args()
+
+    rows = make_rows(args.prefixes, args.points)
+    print(f"{len(rows)} rows, {args.prefixes} prefixes")
+
+    started = time.perf_counter()
+    expected = polyfit_trends(rows, "prefix", "created_at")
+    polyfit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = calculate_trends(rows, "prefix", "created_at")
+    vectorized_seconds = time.perf_counter() - started
+
+    # /data/trends gets (prefix_id, ..., error_count) tuples ordered by prefix_id
+    # and created_at from SQL and fits them without sorting again
+    ids = {prefix: position for position, (prefix, _) in enumerate(expected)}
+    ordered = sorted((ids[row.prefix], row.created_at, row.error_count) for row in rows)
+    started = time.perf_counter()
+    prefix_ids, _, error_counts = zip(*ordered)
+    arrays = np.array(prefix_ids), np.array(error_counts)
+    loaded = time.perf_counter()
+    group_trends(arrays[0], None, arrays[1])
+    fitted = time.perf_counter()
+
+    assert [key for key, _ in actual] == [key for key, _ in expected]
+    error = np.abs(
+        np.array([fit for _, fit in actual]) - np.array([fit for _, fit in expected]),
+    ).max()
+    print(f"polyfit:               {polyfit_seconds:.3f}s")
+    print(
+        f"vectorized:            {vectorized_seconds:.3f}s "
+        f"({polyfit_seconds / vectorized_seconds:.1f}x)",
+    )
+    print(
+        f"vectorized, presorted: {fitted - started:.3f}s "
+        f"({polyfit_seconds / (fitted - started):.1f}x), "
+        f"{loaded - started:.3f}s of it loading the arrays",
+    )
+    print(f"max abs difference: {error:.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Runs once, when the primary's data directory is created: lets the replica
+# stream the WAL as the replication role. For an existing volume, run the
+# statement and append the pg_hba.conf line by hand.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+	CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD '$REPLICATION_PASSWORD';
+EOSQL
+echo "host replication replicator all scram-sha-256" >> "$PGDATA/pg_hba.conf"
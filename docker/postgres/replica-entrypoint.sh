@@ -0,0 +1,17 @@
+#!/bin/sh
+# Clones the primary into an empty data directory and starts it as a hot
+# standby that follows the primary's WAL.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_basebackup -h db -U replicator -D "$PGDATA" -R -X stream; do
+        echo "waiting for the primary"
+        rm -rf "${PGDATA:?}"/*
+        sleep 1
+    done
+    chmod 0700 "$PGDATA"
+fi
+
+# hot_standby_feedback keeps the primary from vacuuming rows that long
+# analytics queries on the replica still read
+exec postgres -c hot_standby_feedback=on
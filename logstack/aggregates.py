@@ -0,0 +1,692 @@
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    Numeric,
+    case,
+    cast,
+    delete,
+    func,
+    select,
+    true,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert
+from sqlalchemy.orm import Session
+
+from logstack.database_models import (
+    ErrorCountSketch,
+    ErrorCountSummary,
+    Flamechart,
+    FlamechartRollup,
+    Prefix,
+    PrefixDiff,
+    PrefixRollup,
+    PrefixTrendStats,
+)
+from logstack.sketches import bucket_of
+
+
+def add_prefix_rollups(db: Session, condition: ColumnElement[bool]) -> None:
+    """Add the flamechart rows matching `condition` to the rollups of their
+    prefixes and of every ancestor of those prefixes.
+
+    The ancestors are walked with a recursive CTE over prefix.parent_id.
+    Nothing is committed.
+    """
+    leaves = (
+        select(
+            Flamechart.upload_uuid,
+            Flamechart.prefix_id,
+            Flamechart.to_date,
+            func.sum(Flamechart.error_count).label("error_count"),
+            func.count().label("row_count"),
+            func.min(Flamechart.error_count).label("min_error_count"),
+            func.max(Flamechart.error_count).label("max_error_count"),
+        )
+        .where(condition)
+        .group_by(Flamechart.upload_uuid, Flamechart.prefix_id, Flamechart.to_date)
+        .cte("leaves")
+    )
+    closure = (
+        select(Prefix.id.label("prefix_id"), Prefix.id.label("ancestor_id"))
+        .where(Prefix.id.in_(select(leaves.c.prefix_id)))
+        .cte("closure", recursive=True)
+    )
+    closure = closure.union_all(
+        select(closure.c.prefix_id, Prefix.parent_id)
+        .join(Prefix, Prefix.id == closure.c.ancestor_id)
+        .where(Prefix.parent_id.is_not(None)),
+    )
+    rollups = (
+        select(
+            closure.c.ancestor_id,
+            leaves.c.upload_uuid,
+            leaves.c.to_date,
+            func.sum(leaves.c.error_count),
+            func.sum(leaves.c.row_count),
+            func.min(leaves.c.min_error_count),
+            func.max(leaves.c.max_error_count),
+        )
+        .join(closure, closure.c.prefix_id == leaves.c.prefix_id)
+        .group_by(closure.c.ancestor_id, leaves.c.upload_uuid, leaves.c.to_date)
+        # a stable order, so concurrent writers lock the rollup rows in the same order
+        .order_by(closure.c.ancestor_id, leaves.c.upload_uuid, leaves.c.to_date)
+    )
+
+    statement = insert(PrefixRollup).from_select(
+        [
+            PrefixRollup.prefix_id,
+            PrefixRollup.upload_uuid,
+            PrefixRollup.to_date,
+            PrefixRollup.error_count,
+            PrefixRollup.row_count,
+            PrefixRollup.min_error_count,
+            PrefixRollup.max_error_count,
+        ],
+        rollups,
+    )
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                PrefixRollup.prefix_id,
+                PrefixRollup.upload_uuid,
+                PrefixRollup.to_date,
+            ],
+            set_={
+                "error_count": PrefixRollup.error_count + excluded.error_count,
+                "row_count": PrefixRollup.row_count + excluded.row_count,
+                "min_error_count": func.least(
+                    PrefixRollup.min_error_count,
+                    excluded.min_error_count,
+                ),
+                "max_error_count": func.greatest(
+                    PrefixRollup.max_error_count,
+                    excluded.max_error_count,
+                ),
+            },
+        ),
+    )
+
+
+def add_trend_stats(db: Session, condition: ColumnElement[bool]) -> None:
+    """Append the flamechart rows matching `condition` to the trend statistics
+    of their prefixes.
+
+    The new rows of a prefix are ranked after the rows already counted, by
+    created_at and then id, and the sums are shifted by the existing count.
+    Rows are assumed to arrive in created_at order; the rebuild ranks all rows
+    by created_at again. Nothing is committed.
+    """
+    rank = (
+        func.row_number().over(
+            partition_by=Flamechart.prefix_id,
+            order_by=(Flamechart.created_at, Flamechart.id),
+        )
+        - 1
+    )
+    ranked = (
+        select(
+            Flamechart.prefix_id,
+            rank.label("x"),
+            Flamechart.error_count.label("y"),
+        )
+        .where(condition)
+        .subquery("ranked")
+    )
+    added = (
+        select(
+            ranked.c.prefix_id,
+            func.count(),
+            func.sum(ranked.c.x),
+            func.sum(ranked.c.y),
+            func.sum(ranked.c.x * ranked.c.y),
+            func.sum(ranked.c.x * ranked.c.x),
+            array_agg(aggregate_order_by(ranked.c.y, ranked.c.x.desc()))[1],
+        )
+        .group_by(ranked.c.prefix_id)
+        # a stable order, so concurrent writers lock the rows in the same order
+        .order_by(ranked.c.prefix_id)
+    )
+
+    statement = insert(PrefixTrendStats).from_select(
+        [
+            PrefixTrendStats.prefix_id,
+            PrefixTrendStats.n,
+            PrefixTrendStats.sum_x,
+            PrefixTrendStats.sum_y,
+            PrefixTrendStats.sum_xy,
+            PrefixTrendStats.sum_xx,
+            PrefixTrendStats.last_error_count,
+        ],
+        added,
+    )
+    excluded = statement.excluded
+    # the added ranks start at the existing count n instead of 0
+    n = PrefixTrendStats.n
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[PrefixTrendStats.prefix_id],
+            set_={
+                "n": n + excluded.n,
+                "sum_x": PrefixTrendStats.sum_x + excluded.sum_x + n * excluded.n,
+                "sum_y": PrefixTrendStats.sum_y + excluded.sum_y,
+                "sum_xy": (
+                    PrefixTrendStats.sum_xy + excluded.sum_xy + n * excluded.sum_y
+                ),
+                "sum_xx": (
+                    PrefixTrendStats.sum_xx
+                    + excluded.sum_xx
+                    + 2 * n * excluded.sum_x
+                    + n * n * excluded.n
+                ),
+                "last_error_count": excluded.last_error_count,
+            },
+        ),
+    )
+
+
+def _add_diffs(
+    db: Session,
+    condition: ColumnElement[bool],
+    continue_series: bool,
+) -> None:
+    previous = func.lag(Flamechart.error_count).over(
+        partition_by=Flamechart.prefix_id,
+        order_by=(Flamechart.created_at, Flamechart.id),
+    )
+    ranked = (
+        select(
+            Flamechart.prefix_id,
+            Flamechart.upload_uuid,
+            Flamechart.error_count,
+            previous.label("previous"),
+        )
+        .where(condition)
+        .subquery("ranked")
+    )
+    previous = ranked.c.previous
+    if continue_series:
+        # the first new row of a prefix follows the last row counted before
+        previous = func.coalesce(previous, PrefixTrendStats.last_error_count)
+    diff = ranked.c.error_count - previous
+    diffs = (
+        select(
+            ranked.c.prefix_id,
+            ranked.c.upload_uuid,
+            func.count(case((diff < 0, 1))),
+            func.count(case((diff > 0, 1))),
+        )
+        .select_from(ranked)
+        .group_by(ranked.c.prefix_id, ranked.c.upload_uuid)
+        # a stable order, so concurrent writers lock the rows in the same order
+        .order_by(ranked.c.prefix_id, ranked.c.upload_uuid)
+    )
+    if continue_series:
+        diffs = diffs.outerjoin(
+            PrefixTrendStats,
+            PrefixTrendStats.prefix_id == ranked.c.prefix_id,
+        )
+
+    statement = insert(PrefixDiff).from_select(
+        [
+            PrefixDiff.prefix_id,
+            PrefixDiff.upload_uuid,
+            PrefixDiff.improvements,
+            PrefixDiff.degradations,
+        ],
+        diffs,
+    )
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[PrefixDiff.prefix_id, PrefixDiff.upload_uuid],
+            set_={
+                "improvements": PrefixDiff.improvements + excluded.improvements,
+                "degradations": PrefixDiff.degradations + excluded.degradations,
+            },
+        ),
+    )
+
+
+def add_prefix_diffs(db: Session, condition: ColumnElement[bool]) -> None:
+    """Diff the flamechart rows matching `condition` against the row before
+    each of them in their prefix and count the improvements and degradations
+    per upload.
+
+    Must run before `add_trend_stats` appends the same rows, it takes the
+    previous value of a prefix's first new row from the trend statistics.
+    Nothing is committed.
+    """
+    # hold the last values of the prefixes until the rows are appended
+    db.execute(
+        select(PrefixTrendStats.prefix_id)
+        .where(
+            PrefixTrendStats.prefix_id.in_(
+                select(Flamechart.prefix_id).where(condition),
+            ),
+        )
+        .order_by(PrefixTrendStats.prefix_id)
+        .with_for_update(),
+    )
+    _add_diffs(db, condition, continue_series=True)
+
+
+def fold_flamechart_rows(
+    db: Session,
+    condition: ColumnElement[bool],
+    period: str,
+) -> None:
+    """Move the flamechart rows matching `condition` into flamechart_rollup,
+    truncating their created_at and to_date to the start of their `period`,
+    a unit of date_trunc.
+
+    The rollups, diffs and trend statistics of the prefixes and the totals of
+    the uploads were computed from the rows when they were ingested and are
+    left as they are. Nothing is committed.
+    """
+    moved = (
+        delete(Flamechart)
+        .where(condition)
+        .returning(
+            Flamechart.prefix_id,
+            Flamechart.environment,
+            func.date_trunc(period, Flamechart.created_at).label("created_at"),
+            func.date_trunc(period, Flamechart.to_date).label("to_date"),
+            Flamechart.error_count,
+        )
+        .cte("moved")
+    )
+    keys = [moved.c.prefix_id, moved.c.environment, moved.c.created_at, moved.c.to_date]
+    folded = (
+        select(
+            *keys,
+            func.count(),
+            func.sum(moved.c.error_count),
+            func.sum(cast(moved.c.error_count, Numeric) * moved.c.error_count),
+            func.min(moved.c.error_count),
+            func.max(moved.c.error_count),
+        )
+        .group_by(*keys)
+        # a stable order, so concurrent writers lock the rollup rows in the same order
+        .order_by(*keys)
+    )
+
+    statement = insert(FlamechartRollup).from_select(
+        [
+            FlamechartRollup.prefix_id,
+            FlamechartRollup.environment,
+            FlamechartRollup.created_at,
+            FlamechartRollup.to_date,
+            FlamechartRollup.row_count,
+            FlamechartRollup.error_count,
+            FlamechartRollup.error_count_squares,
+            FlamechartRollup.min_error_count,
+            FlamechartRollup.max_error_count,
+        ],
+        folded,
+    )
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                FlamechartRollup.prefix_id,
+                FlamechartRollup.environment,
+                FlamechartRollup.created_at,
+                FlamechartRollup.to_date,
+            ],
+            set_={
+                "row_count": FlamechartRollup.row_count + excluded.row_count,
+                "error_count": FlamechartRollup.error_count + excluded.error_count,
+                "error_count_squares": (
+                    FlamechartRollup.error_count_squares + excluded.error_count_squares
+                ),
+                "min_error_count": func.least(
+                    FlamechartRollup.min_error_count,
+                    excluded.min_error_count,
+                ),
+                "max_error_count": func.greatest(
+                    FlamechartRollup.max_error_count,
+                    excluded.max_error_count,
+                ),
+            },
+        ),
+    )
+
+
+def _merge_sketches(db: Session, counted) -> None:
+    """Add the bucket counts of `counted`, a select of prefix_id, to_date,
+    created_at, bucket and a count, to the sketches.
+    """
+    statement = insert(ErrorCountSketch).from_select(
+        [
+            ErrorCountSketch.prefix_id,
+            ErrorCountSketch.to_date,
+            ErrorCountSketch.created_at,
+            ErrorCountSketch.bucket,
+            ErrorCountSketch.row_count,
+        ],
+        counted,
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                ErrorCountSketch.prefix_id,
+                ErrorCountSketch.to_date,
+                ErrorCountSketch.created_at,
+                ErrorCountSketch.bucket,
+            ],
+            set_={
+                "row_count": ErrorCountSketch.row_count + statement.excluded.row_count,
+            },
+        ),
+    )
+
+
+def _bucket_counts(samples, count):
+    keys = [
+        samples.c.prefix_id,
+        samples.c.to_date,
+        samples.c.created_at,
+        samples.c.bucket,
+    ]
+    return (
+        select(*keys, count)
+        .group_by(*keys)
+        # a stable order, so concurrent writers lock the sketch rows in the same order
+        .order_by(*keys)
+    )
+
+
+def add_error_count_sketches(db: Session, condition: ColumnElement[bool]) -> None:
+    """Add the error counts of the flamechart rows matching `condition` to the
+    sketches of their prefixes. Nothing is committed.
+    """
+    samples = (
+        select(
+            Flamechart.prefix_id,
+            Flamechart.to_date,
+            func.date_trunc("day", Flamechart.created_at).label("created_at"),
+            bucket_of(Flamechart.error_count).label("bucket"),
+        )
+        .where(condition)
+        .subquery("samples")
+    )
+    _merge_sketches(db, _bucket_counts(samples, func.count()))
+
+
+def fold_error_count_sketches(
+    db: Session,
+    condition: ColumnElement[bool],
+    period: str,
+) -> None:
+    """Truncate the created_at and to_date of the sketches matching
+    `condition` to the start of their `period`, like `fold_flamechart_rows`
+    does to the rows they count. Nothing is committed.
+    """
+    moved = (
+        delete(ErrorCountSketch)
+        .where(condition)
+        .returning(
+            ErrorCountSketch.prefix_id,
+            func.date_trunc(period, ErrorCountSketch.to_date).label("to_date"),
+            func.date_trunc(period, ErrorCountSketch.created_at).label("created_at"),
+            ErrorCountSketch.bucket,
+            ErrorCountSketch.row_count,
+        )
+        .cte("moved")
+    )
+    _merge_sketches(db, _bucket_counts(moved, func.sum(moved.c.row_count)))
+
+
+def _merge_summaries(db: Session, summed) -> None:
+    """Add `summed`, a select of prefix_id, to_date, created_at, a row count,
+    the sum of the error counts and of their squares and their minimum and
+    maximum, to the error count summaries.
+    """
+    statement = insert(ErrorCountSummary).from_select(
+        [
+            ErrorCountSummary.prefix_id,
+            ErrorCountSummary.to_date,
+            ErrorCountSummary.created_at,
+            ErrorCountSummary.row_count,
+            ErrorCountSummary.error_count,
+            ErrorCountSummary.error_count_squares,
+            ErrorCountSummary.min_error_count,
+            ErrorCountSummary.max_error_count,
+        ],
+        summed,
+    )
+    excluded = statement.excluded
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[
+                ErrorCountSummary.prefix_id,
+                ErrorCountSummary.to_date,
+                ErrorCountSummary.created_at,
+            ],
+            set_={
+                "row_count": ErrorCountSummary.row_count + excluded.row_count,
+                "error_count": ErrorCountSummary.error_count + excluded.error_count,
+                "error_count_squares": (
+                    ErrorCountSummary.error_count_squares + excluded.error_count_squares
+                ),
+                "min_error_count": func.least(
+                    ErrorCountSummary.min_error_count,
+                    excluded.min_error_count,
+                ),
+                "max_error_count": func.greatest(
+                    ErrorCountSummary.max_error_count,
+                    excluded.max_error_count,
+                ),
+            },
+        ),
+    )
+
+
+def _summed(samples, *totals):
+    keys = [samples.c.prefix_id, samples.c.to_date, samples.c.created_at]
+    return (
+        select(*keys, *totals)
+        .group_by(*keys)
+        # a stable order, so concurrent writers lock the summary rows in the same order
+        .order_by(*keys)
+    )
+
+
+def _summed_totals(totals):
+    """`_summed` of a select with the totals of error_count_summary."""
+    return _summed(
+        totals,
+        func.sum(totals.c.row_count),
+        func.sum(totals.c.error_count),
+        func.sum(totals.c.error_count_squares),
+        func.min(totals.c.min_error_count),
+        func.max(totals.c.max_error_count),
+    )
+
+
+def add_error_count_summaries(db: Session, condition: ColumnElement[bool]) -> None:
+    """Add the error counts of the flamechart rows matching `condition` to the
+    summaries of their prefixes. Nothing is committed.
+    """
+    samples = (
+        select(
+            Flamechart.prefix_id,
+            Flamechart.to_date,
+            func.date_trunc("day", Flamechart.created_at).label("created_at"),
+            Flamechart.error_count,
+        )
+        .where(condition)
+        .subquery("samples")
+    )
+    error_count = samples.c.error_count
+    _merge_summaries(
+        db,
+        _summed(
+            samples,
+            func.count(),
+            func.sum(error_count),
+            func.sum(cast(error_count, Numeric) * error_count),
+            func.min(error_count),
+            func.max(error_count),
+        ),
+    )
+
+
+def fold_error_count_summaries(
+    db: Session,
+    condition: ColumnElement[bool],
+    period: str,
+) -> None:
+    """Truncate the created_at and to_date of the summaries matching
+    `condition` to the start of their `period`, like
+    `fold_error_count_sketches`. Nothing is committed.
+    """
+    moved = (
+        delete(ErrorCountSummary)
+        .where(condition)
+        .returning(
+            ErrorCountSummary.prefix_id,
+            func.date_trunc(period, ErrorCountSummary.to_date).label("to_date"),
+            func.date_trunc(period, ErrorCountSummary.created_at).label("created_at"),
+            ErrorCountSummary.row_count,
+            ErrorCountSummary.error_count,
+            ErrorCountSummary.error_count_squares,
+            ErrorCountSummary.min_error_count,
+            ErrorCountSummary.max_error_count,
+        )
+        .cte("moved")
+    )
+    _merge_summaries(db, _summed_totals(moved))
+
+
+class CompactedRowsError(RuntimeError):
+    """Raised when an aggregate can't be rebuilt because the compaction job
+    folded some of the rows it was computed from.
+    """
+
+
+def _check_not_compacted(db: Session, aggregate: str) -> None:
+    """Refuse to rebuild `aggregate` once rows were folded into
+    flamechart_rollup: it is computed per upload or from the order of the
+    rows, which the rollups do not keep, so the folded rows would be lost.
+    """
+    if db.execute(select(FlamechartRollup.id).limit(1)).first() is not None:
+        raise CompactedRowsError(
+            f"flamechart has compacted rows, rebuilding the {aggregate} would "
+            "drop them",
+        )
+
+
+def rebuild_prefix_rollups(db: Session) -> None:
+    """Recompute every prefix rollup from the flamechart table.
+
+    Like the rebuilds of the trend statistics and the diffs, it raises
+    CompactedRowsError, before changing anything, once rows were compacted.
+    """
+    _check_not_compacted(db, "prefix rollups")
+    db.execute(delete(PrefixRollup))
+    add_prefix_rollups(db, true())
+    db.commit()
+
+
+def rebuild_trend_stats(db: Session) -> None:
+    """Recompute the trend statistics of every prefix from the flamechart table."""
+    _check_not_compacted(db, "trend statistics")
+    db.execute(delete(PrefixTrendStats))
+    add_trend_stats(db, true())
+    db.commit()
+
+
+def rebuild_prefix_diffs(db: Session) -> None:
+    """Recompute the improvements and degradations of every prefix and upload
+    from the flamechart table.
+    """
+    _check_not_compacted(db, "prefix diffs")
+    db.execute(delete(PrefixDiff))
+    _add_diffs(db, true(), continue_series=False)
+    db.commit()
+
+
+def rebuild_error_count_sketches(db: Session) -> None:
+    """Recompute the error count sketches of the flamechart rows.
+
+    The sketches of the compacted rows, those with the created_at and to_date
+    of a rollup, are kept: a period is either raw or folded, so no raw row
+    shares them. A rollup left without sketches only kept its mean and is
+    counted as that many rows of it.
+    """
+    folded = (
+        select(FlamechartRollup.id)
+        .where(
+            FlamechartRollup.prefix_id == ErrorCountSketch.prefix_id,
+            FlamechartRollup.created_at == ErrorCountSketch.created_at,
+            FlamechartRollup.to_date == ErrorCountSketch.to_date,
+        )
+        .exists()
+    )
+    db.execute(delete(ErrorCountSketch).where(~folded))
+    add_error_count_sketches(db, true())
+
+    sketched = (
+        select(ErrorCountSketch.bucket)
+        .where(
+            ErrorCountSketch.prefix_id == FlamechartRollup.prefix_id,
+            ErrorCountSketch.created_at == FlamechartRollup.created_at,
+            ErrorCountSketch.to_date == FlamechartRollup.to_date,
+        )
+        .exists()
+    )
+    rollups = (
+        select(
+            FlamechartRollup.prefix_id,
+            FlamechartRollup.to_date,
+            FlamechartRollup.created_at,
+            bucket_of(
+                cast(FlamechartRollup.error_count, Float) / FlamechartRollup.row_count,
+            ).label("bucket"),
+            FlamechartRollup.row_count,
+        )
+        .where(~sketched)
+        .subquery("rollups")
+    )
+    _merge_sketches(db, _bucket_counts(rollups, func.sum(rollups.c.row_count)))
+    db.commit()
+
+
+def rebuild_error_count_summaries(db: Session) -> None:
+    """Recompute the error count summaries of the flamechart rows and, from
+    the rollups, which keep the same totals, of the compacted ones.
+    """
+    db.execute(delete(ErrorCountSummary))
+    add_error_count_summaries(db, true())
+    rollups = select(
+        FlamechartRollup.prefix_id,
+        FlamechartRollup.to_date,
+        FlamechartRollup.created_at,
+        FlamechartRollup.row_count,
+        FlamechartRollup.error_count,
+        FlamechartRollup.error_count_squares,
+        FlamechartRollup.min_error_count,
+        FlamechartRollup.max_error_count,
+    ).subquery("rollups")
+    _merge_summaries(db, _summed_totals(rollups))
+    db.commit()
+
+
+if __name__ == "__main__":
+    from logstack.cache import bump_data_version
+    from logstack.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        rebuild_prefix_rollups(session)
+        rebuild_trend_stats(session)
+        rebuild_prefix_diffs(session)
+        rebuild_error_count_sketches(session)
+        rebuild_error_count_summaries(session)
+        bump_data_version(session)
+    except CompactedRowsError as exc:
+        raise SystemExit(str(exc)) from exc
+    finally:
+        session.close()
@@ -1,11 +1,15 @@
+import functools
+import hashlib
+from collections.abc import Callable
 from http import HTTPStatus
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from logstack.api.models import (
     AllUploadsRequest,
-    BasePrefixRequest,
     BasicStatsChartResponse,
     BasicStatsModel,
     CompareRequest,
@@ -13,15 +17,21 @@ from logstack.api.models import (
     DiffsRequest,
     DiffsResponse,
     GenericResponse,
+    PageResponse,
     PrefixRequest,
+    StatsChartRequest,
     StatsRequest,
     TrendsChartResponse,
     TrendsRequest,
     TrendsResponse,
-    UploadsModel,
     TrendsTableRequest,
+    UploadsModel,
 )
+from logstack.api.responses import TrustedJSONResponse, dumps
+from logstack.cache import get_data_version
 from logstack.controllers import (
+    basic_stats_chart_query,
+    basic_stats_chart_row,
     compare_uploads,
     compute_trend_chart,
     compute_trends,
@@ -31,118 +41,289 @@ from logstack.controllers import (
     get_prefix_autocomplete,
     get_upload_diffs,
     list_upload_times,
+    trend_row,
+    trends_query,
 )
-from logstack.database import get_db
+from logstack.database import AsyncReadSessionLocal, get_async_read_db
+from logstack.pagination import InvalidCursorError
+from logstack.settings import settings
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, comparing weakly."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def _etag(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Tag the response with the data version, the URL, the accepted media type
+    and the request body and answer 304 Not Modified when the client already
+    has it.
+    """
+    version = await db.run_sync(get_data_version)
+    accept = request.headers.get("accept", "")
+    digest = hashlib.sha256(
+        f"{version} {request.url.path}?{request.url.query} {accept} ".encode(),
+    )
+    digest.update(await request.body())
+    etag = f'"{digest.hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _matches(if_none_match, etag):
+        raise HTTPException(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+comparison_router = APIRouter(prefix="/data", dependencies=[Depends(_etag)])
+
+NDJSON = "application/x-ndjson"
+# sent instead of the JSON document when the request accepts it
+_NDJSON_RESPONSE = {
+    HTTPStatus.OK.value: {
+        "content": {NDJSON: {}},
+        "description": "One result per line, with `Accept: application/x-ndjson`",
+    },
+}
+
+
+def _trusted(response: Response, content) -> TrustedJSONResponse:
+    """Send a controller result as it is, with the headers the dependencies set
+    on `response`.
+
+    The controllers build their rows with the fields and types of the response
+    models, so validating every element again is skipped.
+    """
+    return TrustedJSONResponse(content, headers=response.headers)
+
+
+async def _paged(
+    db: AsyncSession,
+    response: Response,
+    controller: Callable,
+    *args,
+) -> TrustedJSONResponse:
+    """Call a paginated controller and build the page response."""
+    try:
+        result, next_cursor = await db.run_sync(controller, *args)
+    except InvalidCursorError as exc:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    return _trusted(response, {"result": result, "next_cursor": next_cursor})
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def _ndjson(
+    response: Response,
+    statement: Select,
+    to_dict: Callable,
+) -> StreamingResponse:
+    """Stream the rows of a query as newline delimited JSON, one `to_dict` of a
+    row per line, while they are read from a server side cursor.
+
+    The rows are read in a session of their own, the one of the request is
+    closed before the body is sent. The headers set on `response` by the
+    dependencies are copied over.
+    """
+    statement = statement.execution_options(yield_per=settings.STREAM_BATCH_SIZE)
 
-comparison_router = APIRouter(prefix="/data")
+    async def lines():
+        async with AsyncReadSessionLocal() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions():
+                yield b"".join(dumps(to_dict(row)) + b"\n" for row in rows)
+
+    return StreamingResponse(lines(), headers=response.headers, media_type=NDJSON)
 
 
 @comparison_router.post("/uploads_all")
-def uploads_all(req: AllUploadsRequest, db: Session = Depends(get_db)):
-    return {
-        "result": get_all_uploads(
-            db,
-            req.page,
-            req.page_size,
-            req.order_by,
-            req.descending,
-        ),
-    }
-
-
-@comparison_router.post("/uploads", response_model=GenericResponse[UploadsModel])
-def api_list_uploads(req: PrefixRequest = Body(...), db: Session = Depends(get_db)):
-    return {"result": list_upload_times(db, req.prefix, req.page, req.page_size)}
-
-
-@comparison_router.post("/diffs", response_model=GenericResponse[DiffsResponse])
-def api_get_diffs(req: DiffsRequest = Body(...), db: Session = Depends(get_db)):
-    return {
-        "result": get_upload_diffs(
-            db,
-            req.prefix,
-            req.upload_uuids,
-            req.page,
-            req.page_size,
-            req.order_by,
-            req.descending,
-        ),
-    }
-
-
-@comparison_router.post("/trends", response_model=GenericResponse[TrendsResponse])
-def api_trends(req: TrendsTableRequest = Body(...), db: Session = Depends(get_db)):
-    return {
-        "result": compute_trends(
-            db,
-            req.prefix,
-            req.order_by,
-            req.descending,
-        ),
-    }
+async def uploads_all(
+    response: Response,
+    req: AllUploadsRequest,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await _paged(
+        db,
+        response,
+        get_all_uploads,
+        req.page,
+        req.page_size,
+        req.order_by,
+        req.descending,
+        req.cursor,
+    )
+
+
+@comparison_router.post("/uploads", response_model=PageResponse[UploadsModel])
+async def api_list_uploads(
+    response: Response,
+    req: PrefixRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await _paged(
+        db,
+        response,
+        list_upload_times,
+        req.prefix,
+        req.page,
+        req.page_size,
+        req.cursor,
+    )
+
+
+@comparison_router.post("/diffs", response_model=PageResponse[DiffsResponse])
+async def api_get_diffs(
+    response: Response,
+    req: DiffsRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await _paged(
+        db,
+        response,
+        get_upload_diffs,
+        req.prefix,
+        req.upload_uuids,
+        req.page,
+        req.page_size,
+        req.order_by,
+        req.descending,
+        req.cursor,
+    )
+
+
+@comparison_router.post(
+    "/trends",
+    response_model=GenericResponse[TrendsResponse],
+    responses=_NDJSON_RESPONSE,
+)
+async def api_trends(
+    request: Request,
+    response: Response,
+    req: TrendsTableRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    if _wants_ndjson(request):
+        query = trends_query(db.sync_session, req.prefix, req.order_by, req.descending)
+        return _ndjson(response, query.statement, trend_row)
+
+    result = await db.run_sync(
+        compute_trends,
+        req.prefix,
+        req.order_by,
+        req.descending,
+    )
+    return _trusted(response, {"result": result})
 
 
 @comparison_router.post(
     "/trends-chart",
     response_model=GenericResponse[TrendsChartResponse],
 )
-def api_trend_chart(req: TrendsRequest = Body(...), db: Session = Depends(get_db)):
-    return {
-        "result": compute_trend_chart(
-            db,
-            req.prefix,
-        ),
-    }
-
-
-@comparison_router.post("/stats", response_model=GenericResponse[BasicStatsModel])
-def api_stats(req: StatsRequest = Body(...), db: Session = Depends(get_db)):
-    return {
-        "result": get_basic_stats(
-            db,
-            req.prefix,
-            req.order_by,
-            req.descending,
-            req.page,
-            req.page_size,
-        ),
-    }
+async def api_trend_chart(
+    response: Response,
+    req: TrendsRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    result = await db.run_sync(compute_trend_chart, req.prefix)
+    return _trusted(response, {"result": result})
+
+
+@comparison_router.post("/stats", response_model=PageResponse[BasicStatsModel])
+async def api_stats(
+    response: Response,
+    req: StatsRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await _paged(
+        db,
+        response,
+        get_basic_stats,
+        req.prefix,
+        req.order_by,
+        req.descending,
+        req.page,
+        req.page_size,
+        req.cursor,
+        req.created_after,
+        req.created_before,
+        req.quantiles,
+        req.exact,
+    )
 
 
 @comparison_router.post(
     "/stats-chart",
     response_model=GenericResponse[BasicStatsChartResponse],
+    responses=_NDJSON_RESPONSE,
 )
-def api_stats_chart(req: BasePrefixRequest = Body(...), db: Session = Depends(get_db)):
-    return {
-        "result": get_basic_stats_chart(db, req.prefix),
-    }
+async def api_stats_chart(
+    request: Request,
+    response: Response,
+    req: StatsChartRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    arguments = (
+        req.prefix,
+        req.created_after,
+        req.created_before,
+        req.quantiles,
+        req.exact,
+    )
+    if _wants_ndjson(request):
+        query = basic_stats_chart_query(db.sync_session, *arguments)
+        return _ndjson(
+            response,
+            query.statement,
+            functools.partial(basic_stats_chart_row, quantiles=req.quantiles),
+        )
 
+    result = await db.run_sync(get_basic_stats_chart, *arguments)
+    return _trusted(response, {"result": result})
 
-@comparison_router.post("/compare", response_model=GenericResponse[CompareResponse])
-def api_compare(req: CompareRequest = Body(...), db: Session = Depends(get_db)):
+
+@comparison_router.post("/compare", response_model=PageResponse[CompareResponse])
+async def api_compare(
+    response: Response,
+    req: CompareRequest = Body(...),
+    db: AsyncSession = Depends(get_async_read_db),
+):
     if req.upload_uuid_1 == req.upload_uuid_2:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail="upload_uuid_1 and upload_uuid_2 must differ",
         )
 
-    return {
-        "result": compare_uploads(
-            db,
-            req.upload_uuid_1,
-            req.upload_uuid_2,
-            req.prefix,
-            req.page,
-            req.page_size,
-        ),
-    }
+    return await _paged(
+        db,
+        response,
+        compare_uploads,
+        req.upload_uuid_1,
+        req.upload_uuid_2,
+        req.prefix,
+        req.page,
+        req.page_size,
+        req.cursor,
+    )
 
 
 @comparison_router.get("/prefix-autocomplete", response_model=GenericResponse[str])
-def get_prefix_suggestions(
+async def get_prefix_suggestions(
+    response: Response,
     prefix: str = Query("/", description="Current prefix"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """Return next-level prefix segments under the given prefix."""
-    return {"result": get_prefix_autocomplete(db, prefix)}
+    result = await db.run_sync(get_prefix_autocomplete, prefix)
+    return _trusted(response, {"result": result})
@@ -1,79 +1,147 @@
 import datetime
 import uuid
+from http import HTTPStatus
 
-from fastapi import APIRouter, Body, Depends, File, Query, UploadFile
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from logstack.api.models import EventRequestModel, EventResponseModel
-from logstack.constants import EVENT
-from logstack.database import SessionLocal, get_db
-from logstack.database_models import Flamechart
+from logstack.api.models import (
+    EventRequestModel,
+    EventResponseModel,
+    GenericResponse,
+    JobResponseModel,
+)
+from logstack.database import get_async_db
+from logstack.database_models import IngestionJob
+from logstack.events import (
+    coalesce_events,
+    event_buffer,
+    event_key,
+    event_row,
+    insert_events,
+)
+from logstack.jobs import (
+    UploadMetadata,
+    create_job,
+    find_duplicate_upload,
+    job_status,
+    release_spool,
+    spool_upload,
+    submit_upload_job,
+)
+from logstack.parsing import UnsupportedCompressionError, detect_compression
+from logstack.settings import settings
 
 ingestion_router = APIRouter(prefix="/ingestion")
 
 
-@ingestion_router.post("/upload-file")
+@ingestion_router.post(
+    "/upload-file",
+    status_code=HTTPStatus.ACCEPTED,
+    response_model=JobResponseModel,
+)
 async def upload_file(
+    response: Response,
     from_date: datetime.date = Query(...),
     to_date: datetime.date = Query(...),
     environment: str | None = Query(None),
     file: UploadFile = File(...),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    created_at = datetime.datetime.now(tz=datetime.UTC)
-    upload_uuid = str(uuid.uuid4())
-    f = await file.read()
-    for line in f.decode().split("\n"):
-        line = line.strip()
-        if not line:
-            continue
-
-        parts = line.rsplit(" ", 1)
-        if len(parts) != 2:
-            continue
-
-        prefix_raw = parts[0].replace(";", "/")
-        if prefix_raw.startswith("//"):
-            prefix_raw = prefix_raw[1:]
-
-        error_count = int(parts[1])
-
-        flamechart_entry = Flamechart(
-            upload_uuid=upload_uuid,
-            filename=file.filename,
-            from_date=from_date,
-            to_date=to_date,
-            created_at=created_at,
-            prefix=prefix_raw,
-            environment=environment,
-            error_count=error_count,
+    """Spool the file and queue an ingestion job for it.
+
+    Uploads whose content, dates and environment match an existing upload are
+    not loaded again; the returned job points at the existing upload instead.
+    """
+    head = await file.read(4)
+    await file.seek(0)
+    try:
+        compression = detect_compression(file.content_type, head)
+    except UnsupportedCompressionError as exc:
+        raise HTTPException(
+            status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+            detail=str(exc),
+        )
+
+    job_id = str(uuid.uuid4())
+    path, content_hash = await run_in_threadpool(spool_upload, file.file, job_id)
+    upload = UploadMetadata(
+        upload_uuid=str(uuid.uuid4()),
+        filename=file.filename,
+        from_date=from_date,
+        to_date=to_date,
+        environment=environment,
+        created_at=datetime.datetime.now(tz=datetime.UTC),
+        compression=compression,
+        content_hash=content_hash,
+    )
+    try:
+        duplicate = await db.run_sync(find_duplicate_upload, upload)
+        if duplicate is None:
+            job = await db.run_sync(create_job, upload, job_id)
+    except Exception:
+        await run_in_threadpool(release_spool, job_id, path)
+        raise
+
+    if duplicate is not None:
+        await run_in_threadpool(release_spool, job_id, path)
+        response.status_code = HTTPStatus.OK
+        return job_status(
+            await db.run_sync(create_job, upload, job_id, duplicate_of=duplicate),
         )
-        db.add(flamechart_entry)
 
-    db.commit()
-    return {"status": "Uploaded and saved."}
+    submit_upload_job(str(job.id), path, upload)
+    return job_status(job)
+
+
+@ingestion_router.get("/jobs/{job_id}", response_model=JobResponseModel)
+async def get_job(job_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(IngestionJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+
+    return job_status(job)
 
 
 @ingestion_router.post("/event", response_model=EventResponseModel)
 async def receive_event(
     payload: EventRequestModel = Body(...),
-    db: SessionLocal = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+):
+    row = event_row(payload, datetime.datetime.now(tz=datetime.UTC))
+    if settings.EVENT_BUFFER_ENABLED:
+        return {"id": str(await event_buffer.add(row, event_key(payload)))}
+
+    [event_id] = await db.run_sync(insert_events, [row])
+    await db.commit()
+    return {"id": str(event_id)}
+
+
+@ingestion_router.post(
+    "/events",
+    response_model=GenericResponse[EventResponseModel],
+)
+async def receive_events(
+    payload: list[EventRequestModel] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
 ):
     created_at = datetime.datetime.now(tz=datetime.UTC)
-    filename = EVENT if payload.filename is None else payload.filename
-    upload_uuid = EVENT if payload.upload_uuid is None else payload.upload_uuid
-    from_date = created_at if payload.from_date is None else payload.from_date
-    to_date = created_at if payload.to_date is None else payload.to_date
-    event = Flamechart(
-        upload_uuid=upload_uuid,
-        filename=filename,
-        from_date=from_date,
-        to_date=to_date,
-        created_at=created_at,
-        prefix=payload.prefix,
-        environment=payload.environment,
-        error_count=payload.error_count,
-    )
-    db.add(event)
-    db.commit()
-    db.refresh(event)
-    return {"id": event.id}
+    rows = [event_row(event, created_at) for event in payload]
+    if settings.EVENT_COALESCE_WINDOW_MS:
+        rows, index = coalesce_events(rows, [event_key(event) for event in payload])
+    else:
+        index = range(len(rows))
+
+    event_ids = await db.run_sync(insert_events, rows)
+    await db.commit()
+    return {"result": [{"id": str(event_ids[position])} for position in index]}
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from logstack.metrics import metrics
+
+metrics_router = APIRouter(prefix="/metrics")
+
+
+@metrics_router.get("")
+def get_metrics():
+    return metrics.snapshot()
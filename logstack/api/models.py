@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Generic, Literal, TypeVar
+from typing import Annotated, Generic, Literal, TypeVar
 
 from pydantic import BaseModel, Field
 
@@ -10,9 +10,17 @@ class GenericResponse(BaseModel, Generic[T]):
     result: list[T]
 
 
+class PageResponse(GenericResponse[T], Generic[T]):
+    next_cursor: str | None = Field(
+        None,
+        description="Cursor of the next page, null on the last page",
+    )
+
+
 class AllUploadsRequest(BaseModel):
     page: int = Field(1, ge=1)
     page_size: int = Field(1000, ge=1, le=1000)
+    cursor: str | None = Field(None, description="next_cursor of the previous page")
     order_by: Literal["upload_uuid", "filename", "created_at", "errors_total"] = (
         "created_at"
     )
@@ -26,6 +34,7 @@ class BasePrefixRequest(BaseModel):
 class PrefixRequest(BasePrefixRequest):
     page: int = Field(1, ge=1)
     page_size: int = Field(1000, ge=1, le=1000)
+    cursor: str | None = Field(None, description="next_cursor of the previous page")
 
 
 class DiffsRequest(PrefixRequest):
@@ -65,17 +74,51 @@ class TrendsChartResponse(BaseModel):
     predict: float
 
 
-class StatsRequest(PrefixRequest):
+class CreatedRangeRequest(BaseModel):
+    created_after: datetime | None = Field(
+        None,
+        description="only rows created at or after this time",
+    )
+    created_before: datetime | None = Field(
+        None,
+        description="only rows created before this time",
+    )
+
+
+class QuantilesRequest(BaseModel):
+    quantiles: list[Annotated[float, Field(ge=0, le=1)]] = Field(
+        [],
+        max_length=10,
+        description="quantiles to compute besides the median, like 0.9 or 0.99",
+    )
+    exact: bool = Field(
+        False,
+        description="compute the median and the quantiles exactly instead of "
+        "merging the error count sketches. A sketch gives the value at a rank "
+        "within 1%, and a quantile is interpolated between the values at its "
+        "two closest ranks, so it is within 1% of the exact one unless those "
+        "two values have opposite signs. The sketches hold whole days of rows, "
+        "so without exact the created range is widened to the days it starts "
+        "and ends in, for every statistic",
+    )
+
+
+class StatsRequest(PrefixRequest, CreatedRangeRequest, QuantilesRequest):
     order_by: str = Field("mean", description="Field to order by")
     descending: bool = Field(True, description="Descending order")
 
 
+class StatsChartRequest(BasePrefixRequest, CreatedRangeRequest, QuantilesRequest):
+    pass
+
+
 class CompareRequest(BaseModel):
     upload_uuid_1: str = Field(..., description="First upload UUID")
     upload_uuid_2: str = Field(..., description="Second upload UUID")
     prefix: str | None = Field(None, description="prefix prefix filter")
     page: int = Field(1, ge=1)
     page_size: int = Field(50, ge=1, le=100)
+    cursor: str | None = Field(None, description="next_cursor of the previous page")
 
 
 class CompareResponse(BaseModel):
@@ -86,11 +129,11 @@ class CompareResponse(BaseModel):
 
 
 class UploadsModel(BaseModel):
-    id: int
     upload_uuid: str
     filename: str
-    prefix: str
-    error_count: int
+    environment: str | None
+    row_count: int
+    errors_total: int
     from_date: datetime
     to_date: datetime
     created_at: datetime
@@ -104,6 +147,8 @@ class BasicStatsModel(BaseModel):
     stddev: float
     min: float
     max: float
+    # by quantile, as requested
+    quantiles: dict[str, float] = {}
 
 
 class BasicStatsChartResponse(BaseModel):
@@ -112,6 +157,7 @@ class BasicStatsChartResponse(BaseModel):
     median: float
     min: float
     max: float
+    quantiles: dict[str, float] = {}
 
 
 class EventRequestModel(BaseModel):
@@ -126,3 +172,17 @@ class EventRequestModel(BaseModel):
 
 class EventResponseModel(BaseModel):
     id: str
+
+
+class JobResponseModel(BaseModel):
+    id: str
+    status: str
+    filename: str
+    upload_uuid: str
+    lines_parsed: int
+    rows_written: int
+    rows_per_second: float | None
+    error: str | None
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
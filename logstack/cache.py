@@ -0,0 +1,124 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from logstack.database_models import DataVersion
+from logstack.metrics import metrics
+from logstack.settings import settings
+
+
+def get_data_version(db: Session) -> int:
+    """Return the current data version, shared by all processes."""
+    return db.execute(select(DataVersion.version)).scalar_one()
+
+
+def increment_data_version(db: Session) -> None:
+    """Invalidate the cached analytics results of every process once the
+    current transaction commits.
+
+    Readers see the new version and the data changed with it together.
+    """
+    db.execute(update(DataVersion).values(version=DataVersion.version + 1))
+
+
+def bump_data_version(db: Session) -> None:
+    """Invalidate the cached analytics results of every process, in a
+    transaction of its own.
+
+    For the maintenance jobs, which change the data in several transactions:
+    call it after the last one, so a result computed from the old data is never
+    stored under the new version. A change made in one transaction increments
+    the version in it instead, see `increment_data_version`.
+    """
+    increment_data_version(db)
+    db.commit()
+
+
+class ResultCache:
+    """Thread safe LRU cache with an optional time to live.
+
+    Values are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_size: int, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (expires at, value)
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or entry[0] > now):
+                self._entries.move_to_end(key)
+                metrics.inc("result_cache.hits")
+                return entry[1]
+
+        metrics.inc("result_cache.misses")
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                metrics.inc("result_cache.evictions")
+            metrics.set("result_cache.size", len(self._entries))
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            metrics.set("result_cache.size", 0)
+
+
+result_cache = ResultCache(
+    settings.RESULT_CACHE_SIZE,
+    settings.RESULT_CACHE_TTL_SECONDS,
+)
+
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def cached(controller: Callable) -> Callable:
+    """Cache the results of a controller taking a session as its first argument.
+
+    Results are keyed by the controller, its arguments with the defaults filled
+    in and the data version, so every ingest invalidates them.
+    """
+    signature = inspect.signature(controller)
+
+    @functools.wraps(controller)
+    def wrapper(session, *args, **kwargs):
+        if not result_cache.max_size:
+            return controller(session, *args, **kwargs)
+
+        bound = signature.bind(session, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = list(bound.arguments.items())[1:]
+        key = (
+            controller.__qualname__,
+            get_data_version(session),
+            tuple((name, _freeze(value)) for name, value in arguments),
+        )
+        return result_cache.get_or_compute(
+            key,
+            lambda: controller(session, *args, **kwargs),
+        )
+
+    return wrapper
@@ -0,0 +1,85 @@
+import datetime
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from logstack.aggregates import (
+    fold_error_count_sketches,
+    fold_error_count_summaries,
+    fold_flamechart_rows,
+)
+from logstack.database_models import ErrorCountSketch, ErrorCountSummary, Flamechart
+from logstack.partitions import add_months, month_start
+from logstack.settings import settings
+
+
+def compaction_cutoff(now: datetime.datetime) -> datetime.datetime:
+    """Rows created before the returned time are folded by `compact`.
+
+    The cutoff is moved back to the start of its period, so a period is
+    either raw or folded, never both.
+    """
+    cutoff = now - datetime.timedelta(days=settings.COMPACTION_AGE_DAYS)
+    cutoff = datetime.datetime.combine(cutoff.date(), datetime.time())
+    if settings.COMPACTION_PERIOD == "week":
+        cutoff -= datetime.timedelta(days=cutoff.weekday())
+    return cutoff
+
+
+def compact(db: Session, now: datetime.datetime | None = None) -> int:
+    """Fold the flamechart rows older than COMPACTION_AGE_DAYS, and their
+    error count sketches and summaries, into daily or weekly rollups, one month
+    at a time so every transaction stays in one partition. Returns the number
+    of months compacted.
+    """
+    now = now or datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    cutoff = compaction_cutoff(now)
+    oldest = db.execute(
+        select(func.min(Flamechart.created_at)).where(Flamechart.created_at < cutoff),
+    ).scalar_one()
+    db.commit()
+
+    months = 0
+    month = None if oldest is None else month_start(oldest)
+    while month is not None and month < cutoff.date():
+        lower = datetime.datetime.combine(month, datetime.time())
+        upper = min(
+            datetime.datetime.combine(add_months(month, 1), datetime.time()), cutoff
+        )
+        fold_flamechart_rows(
+            db,
+            and_(Flamechart.created_at >= lower, Flamechart.created_at < upper),
+            settings.COMPACTION_PERIOD,
+        )
+        fold_error_count_sketches(
+            db,
+            and_(
+                ErrorCountSketch.created_at >= lower,
+                ErrorCountSketch.created_at < upper,
+            ),
+            settings.COMPACTION_PERIOD,
+        )
+        fold_error_count_summaries(
+            db,
+            and_(
+                ErrorCountSummary.created_at >= lower,
+                ErrorCountSummary.created_at < upper,
+            ),
+            settings.COMPACTION_PERIOD,
+        )
+        db.commit()
+        months += 1
+        month = add_months(month, 1)
+    return months
+
+
+if __name__ == "__main__":
+    from logstack.cache import bump_data_version
+    from logstack.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        if compact(session):
+            bump_data_version(session)
+    finally:
+        session.close()
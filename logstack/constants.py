@@ -1 +1,7 @@
 EVENT = "EVENT"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_DUPLICATE = "duplicate"
@@ -1,47 +1,100 @@
-from itertools import groupby
+import datetime
+from collections.abc import Sequence
 from typing import Literal
 
-import numpy as np
-from database_models import Flamechart
-from sqlalchemy import and_, case, func
+from database_models import (
+    ErrorCountSketch,
+    ErrorCountSummary,
+    Flamechart,
+    FlamechartRollup,
+    Prefix,
+    PrefixDiff,
+    PrefixRollup,
+    PrefixTrendStats,
+    Upload,
+)
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Numeric,
+    and_,
+    case,
+    cast,
+    func,
+    literal,
+    or_,
+    select,
+    union_all,
+)
 from sqlalchemy.orm import aliased
 
+from logstack.cache import cached
+from logstack.pagination import paginate
+from logstack.sketches import bucket_value
+from logstack.trends import calculate_trends
+
 
 def _apply_prefix_filter(query, prefix):
     """Apply SQL LIKE prefix filtering, normalizing trailing slashes."""
     if prefix:
         p = prefix.rstrip("/")
-        query = query.filter(Flamechart.prefix.like(f"{p}%"))
+        query = query.filter(Prefix.path.like(f"{p}%"))
     return query
 
 
+def _upload_summary(row) -> dict:
+    return {
+        "upload_uuid": str(row.upload_uuid),
+        "filename": row.filename,
+        "environment": row.environment,
+        "row_count": row.row_count,
+        "errors_total": row.errors_total,
+        "from_date": row.from_date,
+        "to_date": row.to_date,
+        "created_at": row.created_at,
+    }
+
+
+def _ordering(name: str, order_by: str, descending: bool) -> str:
+    return f"{name}:{order_by}:{'desc' if descending else 'asc'}"
+
+
 def list_upload_times(
     session,
     prefix: str | None = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: str | None = None,
 ):
-    """List distinct upload timestamps (created_at), optionally filtered by prefix prefix,
-    with pagination.
+    """List uploads by their timestamps (created_at), optionally only those with
+    rows under a prefix, with pagination.
+
+    Returns the page and the cursor of the next one.
     """
-    q = session.query(Flamechart).distinct().order_by(Flamechart.created_at)
+    q = session.query(Upload)
     if prefix:
-        q = q.filter(Flamechart.prefix.startswith(prefix))
+        # a path has a rollup only if it or one of its descendants has rows, and
+        # the rollups outlive the rows folded by compaction
+        q = q.filter(
+            session.query(PrefixRollup.prefix_id)
+            .join(Prefix, Prefix.id == PrefixRollup.prefix_id)
+            .filter(
+                PrefixRollup.upload_uuid == Upload.upload_uuid,
+                Prefix.path.startswith(prefix),
+            )
+            .exists(),
+        )
 
-    offset = (page - 1) * page_size
-    return [
-        {
-            "id": row.id,
-            "upload_uuid": str(row.upload_uuid),
-            "filename": row.filename,
-            "prefix": row.prefix,
-            "error_count": row.error_count,
-            "from_date": row.from_date,
-            "to_date": row.to_date,
-            "created_at": row.created_at,
-        }
-        for row in q.offset(offset).limit(page_size).all()
-    ]
+    rows, next_cursor = paginate(
+        q,
+        [Upload.created_at, Upload.upload_uuid],
+        lambda row: (row.created_at, row.upload_uuid),
+        _ordering("uploads", "created_at", False),
+        cursor=cursor,
+        page=page,
+        page_size=page_size,
+    )
+    return [_upload_summary(row) for row in rows], next_cursor
 
 
 def get_all_uploads(
@@ -55,39 +108,33 @@ def get_all_uploads(
         "errors_total",
     ] = "created_at",
     descending: bool = True,
+    cursor: str | None = None,
 ):
+    """List uploads ordered by `order_by`, returning the page and the cursor of
+    the next one.
+    """
     order_by_map = {
-        "upload_uuid": Flamechart.upload_uuid,
-        "filename": Flamechart.filename,
-        "created_at": Flamechart.created_at,
-        "errors_total": func.sum(Flamechart.error_count).label("errors_total"),
+        "upload_uuid": Upload.upload_uuid,
+        "filename": Upload.filename,
+        "created_at": Upload.created_at,
+        "errors_total": Upload.errors_total,
     }
     order_by_column = order_by_map[order_by]
-
-    query = (
-        session.query(
-            Flamechart.upload_uuid,
-            Flamechart.filename,
-            Flamechart.created_at,
-            func.sum(Flamechart.error_count).label("errors_total"),
-        )
-        .group_by(
-            Flamechart.upload_uuid,
-            Flamechart.filename,
-            Flamechart.created_at,
-        )
-        .order_by(order_by_column.desc() if descending else order_by_column.asc())
+    keys = [order_by_column]
+    if order_by != "upload_uuid":
+        keys.append(Upload.upload_uuid)
+
+    rows, next_cursor = paginate(
+        session.query(Upload),
+        keys,
+        lambda row: tuple(getattr(row, key.key) for key in keys),
+        _ordering("uploads_all", order_by, descending),
+        descending,
+        cursor,
+        page,
+        page_size,
     )
-    offset = (page - 1) * page_size
-    return [
-        {
-            "upload_uuid": row.upload_uuid,
-            "filename": row.filename,
-            "created_at": row.created_at,
-            "errors_total": row.errors_total,
-        }
-        for row in query.offset(offset).limit(page_size).all()
-    ]
+    return [_upload_summary(row) for row in rows], next_cursor
 
 
 def get_upload_diffs(
@@ -98,86 +145,77 @@ def get_upload_diffs(
     page_size: int = 50,
     order_by: Literal["improvements", "degradations"] = "improvements",
     descending: bool = True,
+    cursor: str | None = None,
 ):
-    """Get per-upload improvements and degradations for specified uploads.
-    Uses a subquery to compute per-row diffs before aggregation.
-    """
-    # 1) Subquery: compute diff per row
-    prev_ec = func.lag(Flamechart.error_count).over(
-        partition_by=Flamechart.prefix,
-        order_by=Flamechart.created_at,
-    )
-    diff_expr = (Flamechart.error_count - prev_ec).label("diff")
-
-    inner_query = session.query(
-        Flamechart.prefix,
-        Flamechart.created_at.label("upload_time"),
-        Flamechart.upload_uuid,
-        diff_expr,
-    )
+    """Get per-upload improvements and degradations for specified uploads,
+    summed from the diffs precomputed at ingest time.
 
+    Returns the page and the cursor of the next one.
+    """
+    q = session.query(
+        Prefix.path.label("prefix"),
+        cast(func.sum(PrefixDiff.improvements), BigInteger).label("improvements"),
+        cast(func.sum(PrefixDiff.degradations), BigInteger).label("degradations"),
+    ).join(Prefix, Prefix.id == PrefixDiff.prefix_id)
     if prefix:
-        # apply prefix filter on prefix in subquery
-        p = prefix.rstrip("/")
-        inner_query = inner_query.filter(Flamechart.prefix.like(f"{p}%"))
-    subq = inner_query.subquery()
-
-    # 2) Outer query: aggregate improvements/degradations
-    improvements = func.sum(case((subq.c.diff < 0, 1), else_=0)).label("improvements")
-    degradations = func.sum(case((subq.c.diff > 0, 1), else_=0)).label("degradations")
-
-    q = session.query(subq.c.prefix, improvements, degradations)
+        q = _apply_prefix_filter(q, prefix)
     if include_upload_uuids:
-        q = q.filter(subq.c.upload_uuid.in_(include_upload_uuids))
-
-    q = q.group_by(subq.c.prefix)
-    offset = (page - 1) * page_size
+        q = q.filter(PrefixDiff.upload_uuid.in_(include_upload_uuids))
+
+    # Page over the aggregates, ordered by the requested one
+    diffs = q.group_by(Prefix.id).subquery()
+    rows, next_cursor = paginate(
+        session.query(diffs),
+        [diffs.c[order_by], diffs.c.prefix],
+        lambda row: (row._mapping[order_by], row.prefix),
+        _ordering("diffs", order_by, descending),
+        descending,
+        cursor,
+        page,
+        page_size,
+    )
     result = [
         {
-            "prefix": row[0],
-            "improvements": row[1],
-            "degradations": row[2],
+            "prefix": row.prefix,
+            "improvements": row.improvements,
+            "degradations": row.degradations,
         }
-        for row in q.offset(offset).limit(page_size).all()
+        for row in rows
     ]
-    return sorted(result, key=lambda row: row[order_by], reverse=descending)
-
-
-def calculate_trends(
-    rows: list[Flamechart],
-    group_by: str,
-    sorting_key: str,
-) -> list[tuple[str, float]]:
-    trends = []
-    for group_by_key, group in groupby(rows, key=lambda r: getattr(r, group_by)):
-        recs = sorted(group, key=lambda row: getattr(row, sorting_key))
-        if len(recs) < 2:
-            trends.append((group_by_key, (1, 0)))
-            continue
+    return result, next_cursor
 
-        x_values = np.array([i for i in range(len(recs))])
-        errors = np.array([r.error_count for r in recs])
-        k, b = np.polyfit(x_values, errors, 1)
-        trends.append((group_by_key, (k, b)))
 
-    return trends
+def _subtree_roots(session, prefix: str):
+    """Ids of the highest prefixes starting with `prefix`.
 
+    Every path starting with `prefix` is in exactly one of their subtrees, so
+    their rollups add up to the totals of all matching paths.
+    """
+    parent = aliased(Prefix)
+    return (
+        session.query(Prefix.id)
+        .outerjoin(parent, parent.id == Prefix.parent_id)
+        .filter(
+            Prefix.path.startswith(prefix),
+            or_(parent.id.is_(None), ~parent.path.startswith(prefix)),
+        )
+    )
 
+
+@cached
 def compute_trend_chart(session, prefix: str = "/"):
-    prefix_len = len(prefix)
-    grouped_prefix = func.substr(Flamechart.prefix, 1, prefix_len).label(
-        "grouped_prefix",
-    )
+    # every matching path starts with the prefix, so it is the only group
+    grouped_prefix = literal(prefix).label("grouped_prefix")
     q = (
         session.query(
-            Flamechart.upload_uuid,
+            PrefixRollup.upload_uuid,
             grouped_prefix,
-            Flamechart.to_date,
-            func.sum(Flamechart.error_count).label("error_count"),
+            PrefixRollup.to_date,
+            cast(func.sum(PrefixRollup.error_count), BigInteger).label("error_count"),
         )
-        .filter(Flamechart.prefix.startswith(prefix))
-        .group_by(Flamechart.upload_uuid, grouped_prefix, Flamechart.to_date)
-        .order_by(Flamechart.to_date.asc())
+        .filter(PrefixRollup.prefix_id.in_(_subtree_roots(session, prefix)))
+        .group_by(PrefixRollup.upload_uuid, PrefixRollup.to_date)
+        .order_by(PrefixRollup.to_date.asc())
     )
     rows = q.all()
     trends = dict(
@@ -195,38 +233,336 @@ def compute_trend_chart(session, prefix: str = "/"):
     ]
 
 
-def compute_trends(
+def trends_query(
     session,
     prefix: str | None = None,
     order_by: Literal["prefix", "slope", "intercept"] = "prefix",
     descending: bool = True,
 ):
-    """Compute linear regression slope of error_count vs. time (days) for each prefix.
-    Returns list of (prefix, slope) sorted by slope descending.
-    Pagination supported.
+    """Build the query of `compute_trends`, ordered in SQL so its rows can be
+    streamed as they are read.
     """
-    # fetch raw series
+    # fit from the sums kept per prefix instead of the raw series
+    stats = PrefixTrendStats
+    n = cast(stats.n, Numeric)
+    slope = case(
+        (stats.n < 2, 1),
+        else_=(n * stats.sum_xy - stats.sum_x * stats.sum_y)
+        / (n * stats.sum_xx - stats.sum_x * stats.sum_x),
+    )
+    intercept = case((stats.n < 2, 0), else_=(stats.sum_y - slope * stats.sum_x) / n)
+    slope, intercept = cast(slope, Float), cast(intercept, Float)
     q = session.query(
-        Flamechart.prefix,
-        Flamechart.created_at,
-        Flamechart.error_count,
-    ).order_by(Flamechart.prefix, Flamechart.created_at)
+        Prefix.path.label("prefix"),
+        slope.label("slope"),
+        intercept.label("intercept"),
+    ).join(Prefix, Prefix.id == stats.prefix_id)
     if prefix:
-        q = q.filter(Flamechart.prefix.startswith(prefix))
-    rows = q.all()
+        q = q.filter(Prefix.path.startswith(prefix))
 
-    trends = calculate_trends(rows, "prefix", "created_at")
-    dict_trends = [
-        {
-            "prefix": trend[0],
-            "slope": trend[1][0],
-            "intercept": trend[1][1],
-        }
-        for trend in trends
+    # paths in byte order, like sorting the strings in Python
+    path = Prefix.path.collate("C")
+    keys = {"prefix": [path], "slope": [slope, path], "intercept": [intercept, path]}
+    return q.order_by(
+        *(key.desc() if descending else key.asc() for key in keys[order_by]),
+    )
+
+
+def trend_row(row) -> dict:
+    return {
+        "prefix": row.prefix,
+        "slope": row.slope,
+        "intercept": row.intercept,
+    }
+
+
+@cached
+def compute_trends(
+    session,
+    prefix: str | None = None,
+    order_by: Literal["prefix", "slope", "intercept"] = "prefix",
+    descending: bool = True,
+):
+    """Least squares line of the error counts of each prefix against their rank
+    by created_at, as dicts of prefix, slope and intercept ordered by
+    `order_by`.
+
+    The lines are fitted from the sums kept per prefix in prefix_trend_stats,
+    updated as rows are ingested, so the raw rows are not read. A prefix with
+    fewer than two rows gets a slope of 1 and an intercept of 0. The sums are
+    recomputed from flamechart by `aggregates.rebuild_trend_stats`, which
+    `python -m logstack.aggregates` runs along with the other rebuilds.
+    """
+    return [
+        trend_row(row)
+        for row in trends_query(session, prefix, order_by, descending).all()
+    ]
+
+
+def _error_counts(
+    key: str,
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+):
+    """Weighted error counts per `key`, a column of flamechart and of
+    flamechart_rollup, from the raw and the compacted rows alike.
+
+    Raw rows with the same key and error count are collapsed into one value
+    weighted by their number. A rollup is its mean weighted by its row count.
+    The creation time range is the partition key of flamechart, so the
+    partitions outside of it are not scanned.
+    """
+    branches = []
+    for table in (Flamechart, FlamechartRollup):
+        if table is Flamechart:
+            error_count = Flamechart.error_count
+            value = cast(error_count, Float)
+            columns = [
+                func.count().label("weight"),
+                func.sum(error_count).label("total"),
+                (func.count() * cast(error_count, Numeric) * error_count).label(
+                    "squares",
+                ),
+                error_count.label("minimum"),
+                error_count.label("maximum"),
+            ]
+        else:
+            value = cast(table.error_count, Float) / table.row_count
+            columns = [
+                table.row_count.label("weight"),
+                table.error_count.label("total"),
+                table.error_count_squares.label("squares"),
+                table.min_error_count.label("minimum"),
+                table.max_error_count.label("maximum"),
+            ]
+        branch = select(
+            getattr(table, key).label("key"), value.label("value"), *columns
+        )
+        if prefix:
+            branch = branch.join(Prefix, Prefix.id == table.prefix_id).where(
+                Prefix.path.startswith(prefix),
+            )
+        if created_after is not None:
+            branch = branch.where(table.created_at >= created_after)
+        if created_before is not None:
+            branch = branch.where(table.created_at < created_before)
+        if table is Flamechart:
+            branch = branch.group_by(getattr(table, key), table.error_count)
+        branches.append(branch)
+    return union_all(*branches).cte("error_counts")
+
+
+def _error_count_totals(samples):
+    """Aggregate the weighted error counts of `_error_counts` per key."""
+    n = func.sum(samples.c.weight)
+    total = func.sum(samples.c.total)
+    variance = (n * func.sum(samples.c.squares) - total * total) / (n * n)
+    return select(
+        samples.c.key,
+        total.label("count"),
+        (total / n).label("mean"),
+        # rounded to the scale of the variance, like stddev_pop
+        func.round(func.sqrt(variance), func.scale(variance)).label("stddev"),
+        func.min(samples.c.minimum).label("min"),
+        func.max(samples.c.maximum).label("max"),
+    ).group_by(samples.c.key)
+
+
+def _interpolated_quantile(ranked, quantile: float, value_at):
+    """The `quantile` of every key of `ranked`, rows with a running total of
+    the weights (upto) and their sum (total), interpolated between the values
+    at the two closest ranks like percentile_cont.
+
+    `value_at` returns the aggregate of the value at the first row matching a
+    condition.
+    """
+    position = cast((ranked.c.total - 1) * quantile, Float)
+    lower = value_at(ranked.c.upto > func.floor(position))
+    upper = value_at(ranked.c.upto > func.ceil(position))
+    fraction = func.max(position) - func.floor(func.max(position))
+    return lower + (upper - lower) * fraction
+
+
+def _exact_quantiles(samples, quantiles: Sequence[float]):
+    """Quantiles of the weighted error counts of `_error_counts` per key, as
+    columns q0, q1 and so on.
+
+    They are interpolated between the two closest values like percentile_cont,
+    so they are exact as long as no rollup is involved.
+    """
+    weight = samples.c.weight
+    ranked = select(
+        samples.c.key,
+        samples.c.value,
+        func.sum(weight)
+        .over(partition_by=samples.c.key, order_by=samples.c.value, rows=(None, 0))
+        .label("upto"),
+        func.sum(weight).over(partition_by=samples.c.key).label("total"),
+    ).subquery("ranked")
+
+    def value_at(condition):
+        return func.min(ranked.c.value).filter(condition)
+
+    columns = [
+        _interpolated_quantile(ranked, quantile, value_at).label(f"q{index}")
+        for index, quantile in enumerate(quantiles)
     ]
-    return sorted(dict_trends, key=lambda x: x[order_by], reverse=descending)
+    return select(ranked.c.key, *columns).group_by(ranked.c.key)
 
 
+def _sketch_rows(
+    table,
+    columns,
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+):
+    """Select `columns` of error_count_sketch or error_count_summary.
+
+    They hold whole days of rows, so the creation time range is widened to the
+    days it starts and ends in.
+    """
+    query = select(*columns)
+    if prefix:
+        query = query.join(Prefix, Prefix.id == table.prefix_id).where(
+            Prefix.path.startswith(prefix),
+        )
+    if created_after is not None:
+        query = query.where(
+            table.created_at > created_after - datetime.timedelta(days=1),
+        )
+    if created_before is not None:
+        query = query.where(table.created_at < created_before)
+    return query
+
+
+def _summed_error_counts(
+    key: str,
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+):
+    """The error count summaries per `key` in the shape of `_error_counts`,
+    for `_error_count_totals`.
+    """
+    return _sketch_rows(
+        ErrorCountSummary,
+        [
+            getattr(ErrorCountSummary, key).label("key"),
+            ErrorCountSummary.row_count.label("weight"),
+            ErrorCountSummary.error_count.label("total"),
+            ErrorCountSummary.error_count_squares.label("squares"),
+            ErrorCountSummary.min_error_count.label("minimum"),
+            ErrorCountSummary.max_error_count.label("maximum"),
+        ],
+        prefix,
+        created_after,
+        created_before,
+    ).cte("error_counts")
+
+
+def _sketch_quantiles(
+    key: str,
+    quantiles: Sequence[float],
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+):
+    """Quantiles of the error counts per `key`, a column of
+    error_count_sketch, merged from the sketches, as columns q0, q1 and so on.
+
+    They are interpolated like the exact ones, between the values the sketches
+    give for the two closest ranks, each within sketches.RELATIVE_ACCURACY of
+    the exact value of its rank. So a quantile is within RELATIVE_ACCURACY of
+    the exact one unless those two values have opposite signs.
+    """
+    sketch_key = getattr(ErrorCountSketch, key)
+    merged = (
+        _sketch_rows(
+            ErrorCountSketch,
+            [
+                sketch_key.label("key"),
+                ErrorCountSketch.bucket,
+                func.sum(ErrorCountSketch.row_count).label("weight"),
+            ],
+            prefix,
+            created_after,
+            created_before,
+        )
+        .group_by(sketch_key, ErrorCountSketch.bucket)
+        .subquery("merged")
+    )
+
+    ranked = select(
+        merged,
+        func.sum(merged.c.weight)
+        .over(partition_by=merged.c.key, order_by=merged.c.bucket, rows=(None, 0))
+        .label("upto"),
+        func.sum(merged.c.weight).over(partition_by=merged.c.key).label("total"),
+    ).subquery("ranked")
+
+    def value_at(condition):
+        return bucket_value(func.min(ranked.c.bucket).filter(condition))
+
+    columns = [
+        _interpolated_quantile(ranked, quantile, value_at).label(f"q{index}")
+        for index, quantile in enumerate(quantiles)
+    ]
+    return select(ranked.c.key, *columns).group_by(ranked.c.key)
+
+
+def _error_count_stats(
+    key: str,
+    quantiles: Sequence[float],
+    exact: bool = False,
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+):
+    """Error count statistics per `key` with the `quantiles` as columns q0, q1
+    and so on.
+
+    They are computed exactly from the raw and the compacted rows, or from the
+    error count summaries and sketches alone, which hold whole days of rows:
+    the creation time range is then widened to the days it starts and ends in.
+    """
+    if exact:
+        samples = _error_counts(key, prefix, created_after, created_before)
+        merged = _exact_quantiles(samples, quantiles)
+    else:
+        samples = _summed_error_counts(key, prefix, created_after, created_before)
+        merged = _sketch_quantiles(
+            key,
+            quantiles,
+            prefix,
+            created_after,
+            created_before,
+        )
+    totals = _error_count_totals(samples).subquery("totals")
+    merged = merged.subquery("quantiles")
+    # the value a bucket stands for may lie past the extremes of its values
+    values = [merged.c[f"q{index}"] for index in range(len(quantiles))]
+    if not exact:
+        values = [
+            func.least(func.greatest(value, totals.c.min), totals.c.max).label(
+                value.name,
+            )
+            for value in values
+        ]
+    # every row is counted in a sketch, so no key is left out of the join
+    return select(totals, *values).join(merged, merged.c.key == totals.c.key)
+
+
+def _quantile_values(row, quantiles: Sequence[float]) -> dict[str, float]:
+    """The extra quantiles of a row of `_error_count_stats`, after the median."""
+    return {
+        str(quantile): float(row._mapping[f"q{index}"])
+        for index, quantile in enumerate(quantiles, 1)
+    }
+
+
+@cached
 def get_basic_stats(
     session,
     prefix: str | None = None,
@@ -234,111 +570,143 @@ def get_basic_stats(
     descending: bool = True,
     page: int = 1,
     page_size: int = 50,
+    cursor: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+    quantiles: Sequence[float] = (),
+    exact: bool = False,
 ):
-    # 1) Define each aggregate and label it
-    sum_column = func.sum(Flamechart.error_count).label("count")
-    mean_col = func.avg(Flamechart.error_count).label("mean")
-    median_col = (
-        func.percentile_cont(0.5).within_group(Flamechart.error_count).label("median")
-    )
-    std_col = func.stddev_pop(Flamechart.error_count).label("stddev")
-    min_col = func.min(Flamechart.error_count).label("min")
-    max_col = func.max(Flamechart.error_count).label("max")
+    """Error count statistics per prefix over its raw and compacted rows, with
+    pagination.
 
-    # 2) Build the base query
-    q = session.query(
-        Flamechart.prefix,
-        sum_column,
-        mean_col,
-        median_col,
-        std_col,
-        min_col,
-        max_col,
-    ).group_by(Flamechart.prefix)
-
-    # 3) Optional prefix filter
-    if prefix:
-        q = q.filter(Flamechart.prefix.like(f"{prefix}%"))
+    The median and the extra `quantiles` are merged from the error count
+    sketches unless `exact` is set. Returns the page and the cursor of the next
+    one.
+    """
+    # 1) Aggregate the error counts of every prefix, optionally filtered
+    summary = _error_count_stats(
+        "prefix_id",
+        (0.5, *quantiles),
+        exact,
+        prefix,
+        created_after,
+        created_before,
+    ).subquery("summary")
+
+    # 2) Name the aggregates by their prefix
+    stats = (
+        session.query(
+            Prefix.path.label("prefix"),
+            summary.c.count,
+            summary.c.mean,
+            summary.c.q0.label("median"),
+            summary.c.stddev,
+            summary.c.min,
+            summary.c.max,
+            *(summary.c[f"q{index}"] for index in range(1, len(quantiles) + 1)),
+        )
+        .join(Prefix, Prefix.id == summary.c.key)
+        .subquery()
+    )
 
-    # 4) Map the user’s order_by key to the actual column
+    # 3) Map the user’s order_by key to the actual column
     ordering_map = {
-        "count": sum_column,
-        "mean": mean_col,
-        "median": median_col,
-        "stddev": std_col,
-        "min": min_col,
-        "max": max_col,
+        "count": stats.c.count,
+        "mean": stats.c.mean,
+        "median": stats.c.median,
+        "stddev": stats.c.stddev,
+        "min": stats.c.min,
+        "max": stats.c.max,
     }
     if order_by not in ordering_map:
         raise ValueError(f"order_by must be one of {list(ordering_map)}")
 
-    order_col = ordering_map[order_by]
-    q = q.order_by(order_col.desc() if descending else order_col.asc())
-
-    # 5) Pagination
-    offset = (page - 1) * page_size
-    return [
+    # 4) Pagination, keyed by the ordered column and the unique prefix
+    rows, next_cursor = paginate(
+        session.query(stats),
+        [ordering_map[order_by], stats.c.prefix],
+        lambda row: (row._mapping[order_by], row.prefix),
+        _ordering("stats", order_by, descending),
+        descending,
+        cursor,
+        page,
+        page_size,
+    )
+    result = [
         {
-            "prefix": row[0],
-            "count": row[1],
-            "mean": row[2],
-            "median": row[3],
-            "stddev": row[4],
-            "min": row[5],
-            "max": row[6],
+            "prefix": row.prefix,
+            "count": float(row.count),
+            "mean": float(row.mean),
+            "median": float(row.median),
+            "stddev": float(row.stddev),
+            "min": float(row.min),
+            "max": float(row.max),
+            "quantiles": _quantile_values(row, quantiles),
         }
-        for row in q.offset(offset).limit(page_size).all()
+        for row in rows
     ]
+    return result, next_cursor
 
 
-def get_basic_stats_chart(
+def basic_stats_chart_query(
     session,
     prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+    quantiles: Sequence[float] = (),
+    exact: bool = False,
 ):
-    # 1) Define each aggregate and label it
-    mean_col = func.avg(Flamechart.error_count).label("mean")
-    median_col = (
-        func.percentile_cont(0.5).within_group(Flamechart.error_count).label("median")
-    )
-    min_col = func.min(Flamechart.error_count).label("min")
-    max_col = func.max(Flamechart.error_count).label("max")
+    """Build the query of `get_basic_stats_chart`.
 
-    if prefix:
-        prefix_len = len(prefix)
-        grouped_prefix = func.substr(Flamechart.prefix, 1, prefix_len).label(
-            "grouped_prefix",
-        )
-        q = (
-            session.query(
-                grouped_prefix,
-                Flamechart.to_date,
-                mean_col,
-                median_col,
-                min_col,
-                max_col,
-            )
-            .filter(Flamechart.prefix.startswith(prefix))
-            .group_by(grouped_prefix, Flamechart.to_date)
-        )
-    else:
-        q = session.query(
-            Flamechart.to_date,
-            mean_col,
-            median_col,
-            min_col,
-            max_col,
-        ).group_by(Flamechart.to_date)
+    Compacted rows are charted at the start of their period.
+    """
+    summary = _error_count_stats(
+        "to_date",
+        (0.5, *quantiles),
+        exact,
+        prefix,
+        created_after,
+        created_before,
+    ).subquery("summary")
+    return session.query(
+        summary.c.key.label("to_date"),
+        summary.c.mean,
+        summary.c.q0.label("median"),
+        summary.c.min,
+        summary.c.max,
+        *(summary.c[f"q{index}"] for index in range(1, len(quantiles) + 1)),
+    ).order_by(summary.c.key.asc())
+
+
+def basic_stats_chart_row(row, quantiles: Sequence[float] = ()) -> dict:
+    return {
+        "to_date": row.to_date,
+        "mean": float(row.mean),
+        "median": float(row.median),
+        "min": float(row.min),
+        "max": float(row.max),
+        "quantiles": _quantile_values(row, quantiles),
+    }
 
-    return [
-        {
-            "to_date": row.to_date,
-            "mean": row.mean,
-            "median": row.median,
-            "min": row.min,
-            "max": row.max,
-        }
-        for row in q.order_by(Flamechart.to_date.asc()).all()
-    ]
+
+@cached
+def get_basic_stats_chart(
+    session,
+    prefix: str | None = None,
+    created_after: datetime.datetime | None = None,
+    created_before: datetime.datetime | None = None,
+    quantiles: Sequence[float] = (),
+    exact: bool = False,
+):
+    query = basic_stats_chart_query(
+        session,
+        prefix,
+        created_after,
+        created_before,
+        quantiles,
+        exact,
+    )
+    return [basic_stats_chart_row(row, quantiles) for row in query.all()]
 
 
 def compare_uploads(
@@ -348,53 +716,80 @@ def compare_uploads(
     prefix: str | None = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: str | None = None,
 ):
     """Compare two specific uploads (by exact created_at timestamps).
-    Returns per-prefix error counts and delta between date2 - date1.
+    Returns per-prefix error counts and delta between date2 - date1, and the
+    cursor of the next page.
     """
     f1 = aliased(Flamechart)
     f2 = aliased(Flamechart)
 
     join_cond = and_(
-        f1.prefix == f2.prefix,
+        f1.prefix_id == f2.prefix_id,
         f1.upload_uuid == upload_1_uuid,
         f2.upload_uuid == upload_2_uuid,
     )
 
-    q = session.query(
-        f1.prefix,
-        f1.error_count.label("error_count_1"),
-        f2.error_count.label("error_count_2"),
-        (f2.error_count - f1.error_count).label("delta"),
-    ).join(f2, join_cond)
+    abs_delta = func.abs(f2.error_count - f1.error_count)
+    q = (
+        session.query(
+            Prefix.path,
+            f1.error_count.label("error_count_1"),
+            f2.error_count.label("error_count_2"),
+            (f2.error_count - f1.error_count).label("delta"),
+            abs_delta.label("abs_delta"),
+            f1.id.label("id_1"),
+            f2.id.label("id_2"),
+        )
+        .select_from(f1)
+        .join(f2, join_cond)
+        .join(Prefix, Prefix.id == f1.prefix_id)
+    )
 
     if prefix:
-        q = q.filter(f1.prefix.startswith(prefix))
-
-    # sort by absolute delta desc
-    q = q.order_by(func.abs(f2.error_count - f1.error_count).desc())
-
-    offset = (page - 1) * page_size
-    return [
+        q = q.filter(Prefix.path.startswith(prefix))
+
+    # sort by absolute delta desc, the row ids make the order unique
+    rows, next_cursor = paginate(
+        q,
+        [abs_delta, f1.id, f2.id],
+        lambda row: (row.abs_delta, row.id_1, row.id_2),
+        _ordering("compare", "delta", True),
+        True,
+        cursor,
+        page,
+        page_size,
+    )
+    result = [
         {
-            "prefix": row[0],
-            "error_count_1": row[1],
-            "error_count_2": row[2],
-            "delta": row[3],
+            "prefix": row.path,
+            "error_count_1": row.error_count_1,
+            "error_count_2": row.error_count_2,
+            "delta": row.delta,
         }
-        for row in q.offset(offset).limit(page_size).all()
+        for row in rows
     ]
+    return result, next_cursor
 
 
 def get_prefix_autocomplete(session, prefix: str) -> list[str]:
     like_pattern = f"{prefix.rstrip('/')}%"
-    query = session.query(Flamechart.prefix).filter(
-        Flamechart.prefix.like(like_pattern),
+    # the prefix table also holds ancestors, only suggest paths that have raw
+    # or compacted rows
+    query = session.query(Prefix.path).filter(
+        Prefix.path.like(like_pattern),
+        or_(
+            select(Flamechart.id).where(Flamechart.prefix_id == Prefix.id).exists(),
+            select(FlamechartRollup.id)
+            .where(FlamechartRollup.prefix_id == Prefix.id)
+            .exists(),
+        ),
     )
 
     next_segments = set()
     for row in query.limit(1000):
-        remaining = row.prefix[len(prefix) :]
+        remaining = row.path[len(prefix) :]
         if not remaining:
             continue
 
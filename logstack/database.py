@@ -1,5 +1,14 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import datetime
+import io
+from collections.abc import Iterable, Sequence
+
+from sqlalchemy import TableClause, create_engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker
 
 from logstack.settings import settings
 
@@ -13,7 +22,16 @@ def get_url() -> str:
     )
 
 
-engine = create_engine(get_url())
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.POSTGRES_POOL_SIZE,
+        "max_overflow": settings.POSTGRES_MAX_OVERFLOW,
+        "pool_timeout": settings.POSTGRES_POOL_TIMEOUT,
+        "pool_recycle": settings.POSTGRES_POOL_RECYCLE,
+    }
+
+
+engine = create_engine(get_url(), **_pool_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -23,3 +41,139 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _create_async_engine(url: str) -> AsyncEngine:
+    server_settings = {}
+    if settings.POSTGRES_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(
+            settings.POSTGRES_STATEMENT_TIMEOUT_MS,
+        )
+    return create_async_engine(
+        make_url(url).set(drivername="postgresql+asyncpg"),
+        connect_args={"server_settings": server_settings},
+        **_pool_options(),
+    )
+
+
+# Requests run their queries on asyncpg, so a slow query does not block the
+# event loop. Sync code such as the controllers is called with `run_sync`.
+async_engine = _create_async_engine(get_url())
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+# Analytics only read, so they go to the replica when there is one. Ingestion
+# always writes to the primary.
+async_read_engine = (
+    _create_async_engine(settings.POSTGRES_READ_URL)
+    if settings.POSTGRES_READ_URL
+    else async_engine
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def escape_copy_text(value: str) -> str:
+    """Escape a string for the PostgreSQL COPY text format."""
+    if "\\" in value or "\t" in value or "\n" in value or "\r" in value:
+        return value.translate(_COPY_ESCAPES)
+    return value
+
+
+def _copy_value(value) -> str:
+    """Render a value in the PostgreSQL COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return escape_copy_text(str(value))
+
+
+def format_copy_row(row: Sequence) -> str:
+    """Render a row as one line of PostgreSQL COPY text."""
+    return "\t".join(_copy_value(value) for value in row) + "\n"
+
+
+class BulkCopyWriter:
+    """Stream rows into a table with `COPY ... FROM STDIN`.
+
+    Rows are buffered as COPY text and sent every `batch_size` rows, so memory
+    stays bounded by one batch. The data is written inside the session's
+    transaction and becomes visible when the caller commits.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        table: TableClause,
+        columns: Sequence[str],
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+    ):
+        self.session = session
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+        self._buffer = io.StringIO()
+        self._pending = 0
+
+    def add(self, row: Sequence) -> None:
+        self.add_copy_line(format_copy_row(row))
+
+    def add_copy_line(self, line: str) -> None:
+        """Add a row that is already rendered as a line of COPY text."""
+        self._buffer.write(line)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def add_many(self, rows: Iterable[Sequence]) -> None:
+        for row in rows:
+            self.add(row)
+
+    def add_copy_text(self, text: str, rows: int) -> None:
+        """Send `rows` rows that are already rendered as COPY text."""
+        self.flush()
+        self._copy(io.StringIO(text))
+        self.rows_written += rows
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        self._buffer.seek(0)
+        self._copy(self._buffer)
+        self.rows_written += self._pending
+        self._buffer = io.StringIO()
+        self._pending = 0
+
+    def _copy(self, data: io.StringIO) -> None:
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(self._statement, data)
+        finally:
+            cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
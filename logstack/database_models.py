@@ -1,20 +1,279 @@
-from sqlalchemy import UUID, Column, DateTime, Integer, String
+import datetime
+
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    SmallInteger,
+    String,
+    TypeDecorator,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
 
+class UTCDateTime(TypeDecorator):
+    """A timestamp without time zone holding UTC.
+
+    Aware datetimes are converted to UTC and dates to their midnight before
+    they are sent. psycopg2 leaves that to the server, asyncpg refuses them.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(datetime.UTC).replace(tzinfo=None)
+            return value
+        if isinstance(value, datetime.date):
+            return datetime.datetime.combine(value, datetime.time())
+        return value
+
+
+class Prefix(Base):
+    __tablename__ = "prefix"
+    __table_args__ = (
+        # serves `path LIKE 'x%'` under any collation, the unique index only
+        # does under C
+        Index(
+            "ix_prefix_path_pattern",
+            "path",
+            postgresql_ops={"path": "text_pattern_ops"},
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, unique=True, nullable=False)
+    depth = Column(Integer, nullable=False)
+    parent_id = Column(Integer, ForeignKey("prefix.id"), index=True, nullable=True)
+
+
 class Flamechart(Base):
+    """One row of an upload or an event.
+
+    The table is partitioned by month of created_at, see `logstack.partitions`.
+    A primary key of a partitioned table has to contain the partition key.
+    """
+
     __tablename__ = "flamechart"
+    __table_args__ = (
+        # the covering indexes let the analytics read error counts with
+        # index-only scans: the rows of an upload by prefix (compare_uploads)
+        Index(
+            "ix_flamechart_upload_uuid_prefix_id",
+            "upload_uuid",
+            "prefix_id",
+            postgresql_include=["error_count", "id"],
+        ),
+        # a prefix's series in the order its diffs and trends are ranked in
+        Index(
+            "ix_flamechart_prefix_id_created_at",
+            "prefix_id",
+            "created_at",
+            "id",
+            postgresql_include=["error_count", "upload_uuid"],
+        ),
+        # a prefix's rows by date (stats and stats-chart)
+        Index(
+            "ix_flamechart_prefix_id_to_date",
+            "prefix_id",
+            "to_date",
+            postgresql_include=["error_count", "created_at"],
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     filename = Column(String, index=True, nullable=False)
-    upload_uuid = Column(UUID, index=True, nullable=False)
-    prefix = Column(String, index=True, nullable=False)
+    upload_uuid = Column(UUID, nullable=False)
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), nullable=False)
     error_count = Column(Integer, nullable=False)
 
     environment = Column(String, nullable=True)
 
-    from_date = Column(DateTime, index=True, nullable=False)
-    to_date = Column(DateTime, index=True, nullable=False)
-    created_at = Column(DateTime, index=True, nullable=False)
+    from_date = Column(UTCDateTime, index=True, nullable=False)
+    to_date = Column(UTCDateTime, index=True, nullable=False)
+    created_at = Column(UTCDateTime, primary_key=True, index=True)
+
+
+class FlamechartRollup(Base):
+    """Flamechart rows folded by the compaction job, see `logstack.compaction`.
+
+    A row holds the rows of a prefix and environment whose created_at and
+    to_date fall in the same periods, with both truncated to the period start.
+    """
+
+    __tablename__ = "flamechart_rollup"
+    __table_args__ = (
+        UniqueConstraint(
+            "prefix_id",
+            "environment",
+            "created_at",
+            "to_date",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), nullable=False)
+    environment = Column(String, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+    to_date = Column(UTCDateTime, nullable=False)
+
+    row_count = Column(BigInteger, nullable=False)
+    error_count = Column(BigInteger, nullable=False)
+    # sum of the squared error counts, for the standard deviation
+    error_count_squares = Column(Numeric, nullable=False)
+    min_error_count = Column(Integer, nullable=False)
+    max_error_count = Column(Integer, nullable=False)
+
+
+class ErrorCountSketch(Base):
+    """How many error counts of a prefix's rows with the same to_date, created
+    the same day, fall in a bucket, see `logstack.sketches`.
+
+    Compacted rows keep their sketches, with created_at and to_date truncated
+    like the rollups they were folded into.
+    """
+
+    __tablename__ = "error_count_sketch"
+
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), primary_key=True)
+    to_date = Column(UTCDateTime, primary_key=True)
+    # the start of the day the rows were created
+    created_at = Column(UTCDateTime, primary_key=True)
+    bucket = Column(SmallInteger, primary_key=True)
+
+    row_count = Column(BigInteger, nullable=False)
+
+
+class ErrorCountSummary(Base):
+    """Totals of the error counts an error count sketch with the same key
+    counts, for the statistics read along with the sketches.
+
+    Compacted rows keep their summaries, truncated like their sketches.
+    """
+
+    __tablename__ = "error_count_summary"
+
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), primary_key=True)
+    to_date = Column(UTCDateTime, primary_key=True)
+    # the start of the day the rows were created
+    created_at = Column(UTCDateTime, primary_key=True)
+
+    row_count = Column(BigInteger, nullable=False)
+    error_count = Column(BigInteger, nullable=False)
+    # sum of the squared error counts, for the standard deviation
+    error_count_squares = Column(Numeric, nullable=False)
+    min_error_count = Column(Integer, nullable=False)
+    max_error_count = Column(Integer, nullable=False)
+
+
+class PrefixRollup(Base):
+    """Totals of an upload's rows under a prefix, the prefix itself included."""
+
+    __tablename__ = "prefix_rollup"
+    __table_args__ = (
+        # a subtree's totals by date (trend-chart)
+        Index(
+            "ix_prefix_rollup_prefix_id_to_date",
+            "prefix_id",
+            "to_date",
+            postgresql_include=["upload_uuid", "error_count"],
+        ),
+    )
+
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), primary_key=True)
+    upload_uuid = Column(UUID, primary_key=True)
+    to_date = Column(UTCDateTime, primary_key=True)
+
+    error_count = Column(BigInteger, nullable=False)
+    row_count = Column(BigInteger, nullable=False)
+    min_error_count = Column(Integer, nullable=False)
+    max_error_count = Column(Integer, nullable=False)
+
+
+class PrefixTrendStats(Base):
+    """Least squares sums of a prefix's error counts (y) against their rank by
+    created_at (x).
+    """
+
+    __tablename__ = "prefix_trend_stats"
+
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), primary_key=True)
+    n = Column(BigInteger, nullable=False)
+    sum_x = Column(Numeric, nullable=False)
+    sum_y = Column(Numeric, nullable=False)
+    sum_xy = Column(Numeric, nullable=False)
+    sum_xx = Column(Numeric, nullable=False)
+    # y of the last row, the previous value of the next row's diff
+    last_error_count = Column(Integer, nullable=True)
+
+
+class PrefixDiff(Base):
+    """How often a prefix's error count fell or rose in an upload's rows,
+    compared to the row before each of them.
+    """
+
+    __tablename__ = "prefix_diff"
+
+    prefix_id = Column(Integer, ForeignKey("prefix.id"), primary_key=True)
+    upload_uuid = Column(UUID, primary_key=True)
+    improvements = Column(BigInteger, nullable=False)
+    degradations = Column(BigInteger, nullable=False)
+
+
+class Upload(Base):
+    __tablename__ = "upload"
+
+    upload_uuid = Column(UUID, primary_key=True)
+    filename = Column(String, nullable=False)
+    environment = Column(String, nullable=True)
+    content_hash = Column(String, index=True, nullable=True)
+
+    from_date = Column(UTCDateTime, nullable=False)
+    to_date = Column(UTCDateTime, nullable=False)
+    created_at = Column(UTCDateTime, index=True, nullable=False)
+
+    row_count = Column(BigInteger, nullable=False, server_default="0")
+    errors_total = Column(BigInteger, nullable=False, server_default="0")
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_job"
+
+    id = Column(UUID, primary_key=True)
+    status = Column(String, index=True, nullable=False)
+    filename = Column(String, nullable=False)
+    upload_uuid = Column(UUID, nullable=False)
+
+    lines_parsed = Column(BigInteger, nullable=False, default=0)
+    rows_written = Column(BigInteger, nullable=False, default=0)
+    error = Column(String, nullable=True)
+
+    created_at = Column(UTCDateTime, nullable=False)
+    started_at = Column(UTCDateTime, nullable=True)
+    finished_at = Column(UTCDateTime, nullable=True)
+
+
+class DataVersion(Base):
+    """A single row counter, incremented with every change of the analytics
+    results, in the same transaction or, for the maintenance jobs, after it.
+
+    A table rather than a sequence, since standbys only see sequence values in
+    batches and would keep serving stale results.
+    """
+
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
@@ -0,0 +1,287 @@
+import asyncio
+import datetime
+import time
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from logstack.aggregates import (
+    add_error_count_sketches,
+    add_error_count_summaries,
+    add_prefix_diffs,
+    add_prefix_rollups,
+    add_trend_stats,
+)
+from logstack.api.models import EventRequestModel
+from logstack.cache import increment_data_version
+from logstack.constants import EVENT
+from logstack.database import AsyncSessionLocal
+from logstack.database_models import Flamechart, Upload
+from logstack.metrics import metrics
+from logstack.partitions import ensure_partitions
+from logstack.prefixes import resolve_prefix_ids
+from logstack.settings import settings
+
+
+def event_row(payload: EventRequestModel, created_at: datetime.datetime) -> dict:
+    """Build a flamechart row for an event, filling in the defaults."""
+    return {
+        "upload_uuid": EVENT if payload.upload_uuid is None else payload.upload_uuid,
+        "filename": EVENT if payload.filename is None else payload.filename,
+        "from_date": created_at if payload.from_date is None else payload.from_date,
+        "to_date": created_at if payload.to_date is None else payload.to_date,
+        "created_at": created_at,
+        "prefix": payload.prefix,
+        "environment": payload.environment,
+        "error_count": payload.error_count,
+    }
+
+
+def event_key(payload: EventRequestModel) -> tuple:
+    """Key under which identical events are coalesced.
+
+    Dates are part of the key only when the client sent them explicitly, so
+    events that default to their arrival time can be merged.
+    """
+    return (
+        payload.prefix,
+        payload.environment,
+        payload.filename,
+        payload.upload_uuid,
+        payload.from_date,
+        payload.to_date,
+    )
+
+
+def merge_event(target: dict, row: dict) -> None:
+    """Fold `row` into `target`, summing the error counts.
+
+    The rows become one row of the analytics: only the sums of the error counts
+    are the same as if both had been inserted.
+    """
+    target["error_count"] += row["error_count"]
+    target["from_date"] = min(target["from_date"], row["from_date"])
+    target["to_date"] = max(target["to_date"], row["to_date"])
+
+
+def coalesce_events(
+    rows: list[dict],
+    keys: list[tuple],
+) -> tuple[list[dict], list[int]]:
+    """Merge rows with equal keys.
+
+    Returns the merged rows and, for every input row, the index of the merged
+    row it was folded into.
+    """
+    merged: list[dict] = []
+    positions: dict[tuple, int] = {}
+    index = []
+    for row, key in zip(rows, keys):
+        position = positions.get(key)
+        if position is None:
+            position = positions[key] = len(merged)
+            merged.append(dict(row))
+        else:
+            merge_event(merged[position], row)
+        index.append(position)
+    return merged, index
+
+
+def upload_totals(rows: list[dict]) -> list[dict]:
+    """Summarize event rows into one upload row per upload_uuid."""
+    totals: dict[object, dict] = {}
+    for row in rows:
+        total = totals.get(row["upload_uuid"])
+        if total is None:
+            totals[row["upload_uuid"]] = {
+                "upload_uuid": row["upload_uuid"],
+                "filename": row["filename"],
+                "environment": row["environment"],
+                "from_date": row["from_date"],
+                "to_date": row["to_date"],
+                "created_at": row["created_at"],
+                "row_count": 1,
+                "errors_total": row["error_count"],
+            }
+        else:
+            total["from_date"] = min(total["from_date"], row["from_date"])
+            total["to_date"] = max(total["to_date"], row["to_date"])
+            total["row_count"] += 1
+            total["errors_total"] += row["error_count"]
+    # a stable order, so concurrent writers lock the upload rows in the same order
+    return sorted(totals.values(), key=lambda total: str(total["upload_uuid"]))
+
+
+def record_event_uploads(db: Session, rows: list[dict]) -> None:
+    """Add the event rows to the totals of their uploads."""
+    statement = pg_insert(Upload)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Upload.upload_uuid],
+            set_={
+                "from_date": func.least(Upload.from_date, statement.excluded.from_date),
+                "to_date": func.greatest(Upload.to_date, statement.excluded.to_date),
+                "row_count": Upload.row_count + statement.excluded.row_count,
+                "errors_total": Upload.errors_total + statement.excluded.errors_total,
+            },
+        ),
+        upload_totals(rows),
+    )
+
+
+def insert_events(db: Session, rows: list[dict]) -> list[int]:
+    """Insert event rows as multi-row INSERTs and return their ids in order.
+
+    The prefix rollups, diffs, trend statistics, error count sketches and
+    summaries and the totals of the uploads the events belong to are updated
+    as well, and the data version is incremented so it commits with them.
+    Nothing is committed.
+    """
+    if not rows:
+        return []
+
+    ensure_partitions(db, {row["created_at"] for row in rows})
+    prefix_ids = resolve_prefix_ids(db, {row["prefix"] for row in rows})
+    result = db.execute(
+        insert(Flamechart).returning(Flamechart.id, sort_by_parameter_order=True),
+        [
+            {
+                **{key: value for key, value in row.items() if key != "prefix"},
+                "prefix_id": prefix_ids[row["prefix"]],
+            }
+            for row in rows
+        ],
+    )
+    ids = list(result.scalars())
+    add_prefix_rollups(db, Flamechart.id.in_(ids))
+    add_prefix_diffs(db, Flamechart.id.in_(ids))
+    add_trend_stats(db, Flamechart.id.in_(ids))
+    add_error_count_sketches(db, Flamechart.id.in_(ids))
+    add_error_count_summaries(db, Flamechart.id.in_(ids))
+    record_event_uploads(db, rows)
+    increment_data_version(db)
+    return ids
+
+
+async def _write_events(rows: list[dict]) -> list[int]:
+    async with AsyncSessionLocal() as db:
+        ids = await db.run_sync(insert_events, rows)
+        await db.commit()
+        return ids
+
+
+class EventBuffer:
+    """Collect events in memory and write them with one multi-row insert.
+
+    The pending rows are flushed when `max_size` of them are collected or
+    `max_latency_ms` after the first one arrived, whichever comes first. Each
+    caller waits for the flush that writes its event and gets the row id.
+
+    With `coalesce` enabled, events with the same key are merged into a single
+    pending row whose error count is the sum of theirs, see `merge_event`, so
+    `max_latency_ms` is also the coalescing window.
+    """
+
+    def __init__(self, max_size: int, max_latency_ms: int, coalesce: bool = False):
+        self.max_size = max_size
+        self.max_latency_ms = max_latency_ms
+        self.coalesce = coalesce
+        self._pending: dict[object, tuple[dict, list[asyncio.Future]]] = {}
+        self._first_added_at = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        metrics.set("event_buffer.max_size", max_size)
+        metrics.set("event_buffer.max_latency_ms", max_latency_ms)
+
+    async def add(self, row: dict, key: tuple | None = None) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            self._first_added_at = time.monotonic()
+            self._timer = loop.call_later(
+                self.max_latency_ms / 1000,
+                self._flush_in_background,
+                "latency",
+            )
+
+        if not self.coalesce or key is None:
+            key = object()
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = (dict(row), [future])
+        else:
+            merge_event(entry[0], row)
+            entry[1].append(future)
+            metrics.inc("event_buffer.events_coalesced")
+
+        if len(self._pending) >= self.max_size:
+            self._flush_in_background("size")
+
+        return await future
+
+    def _take(self) -> list[tuple[dict, list[asyncio.Future]]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = list(self._pending.values()), {}
+        if pending:
+            metrics.observe(
+                "event_buffer.wait_ms",
+                (time.monotonic() - self._first_added_at) * 1000,
+            )
+        return pending
+
+    def _flush_in_background(self, trigger: str) -> None:
+        pending = self._take()
+        if not pending:
+            return
+
+        task = asyncio.create_task(self._write(pending, trigger))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, trigger: str = "manual") -> None:
+        pending = self._take()
+        if pending:
+            await self._write(pending, trigger)
+
+    async def _write(
+        self,
+        pending: list[tuple[dict, list[asyncio.Future]]],
+        trigger: str,
+    ) -> None:
+        metrics.inc(f"event_buffer.flushes.{trigger}")
+        metrics.observe("event_buffer.flush_size", len(pending))
+        started = time.monotonic()
+        try:
+            ids = await _write_events([row for row, _ in pending])
+        # handed to every caller waiting on the flush, which raises it
+        except Exception as exc:  # noqa: BLE001
+            metrics.inc("event_buffer.flush_failures")
+            metrics.inc("event_buffer.rows_failed", len(pending))
+            for _, futures in pending:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+
+        metrics.inc("event_buffer.flush_successes")
+        metrics.inc("event_buffer.rows_written", len(pending))
+        metrics.observe("event_buffer.flush_ms", (time.monotonic() - started) * 1000)
+        for (_, futures), event_id in zip(pending, ids):
+            for future in futures:
+                if not future.done():
+                    future.set_result(event_id)
+
+    async def close(self) -> None:
+        await self.flush("shutdown")
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+event_buffer = EventBuffer(
+    settings.EVENT_BUFFER_MAX_SIZE,
+    settings.EVENT_COALESCE_WINDOW_MS or settings.EVENT_BUFFER_MAX_LATENCY_MS,
+    coalesce=settings.EVENT_COALESCE_WINDOW_MS > 0,
+)
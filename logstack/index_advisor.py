@@ -0,0 +1,188 @@
+import argparse
+import datetime
+from collections.abc import Callable
+from contextlib import contextmanager
+
+from sqlalchemy import Connection, event, select, text
+from sqlalchemy.orm import Session
+
+from logstack.controllers import (
+    compare_uploads,
+    compute_trend_chart,
+    compute_trends,
+    get_all_uploads,
+    get_basic_stats,
+    get_basic_stats_chart,
+    get_prefix_autocomplete,
+    get_upload_diffs,
+    list_upload_times,
+)
+from logstack.database_models import Flamechart, Prefix, PrefixRollup, Upload
+
+
+def _uncached(controller: Callable) -> Callable:
+    return getattr(controller, "__wrapped__", controller)
+
+
+def representative_arguments(db: Session) -> tuple[str, list[str]]:
+    """Pick the two latest uploads that still have rows and the top level
+    prefix with the most rows in the latest of them.
+    """
+    uploads = [
+        str(upload_uuid)
+        for upload_uuid in db.execute(
+            select(Upload.upload_uuid)
+            .where(
+                select(Flamechart.id)
+                .where(Flamechart.upload_uuid == Upload.upload_uuid)
+                .exists(),
+            )
+            .order_by(Upload.created_at.desc())
+            .limit(2),
+        ).scalars()
+    ]
+    if len(uploads) < 2:
+        raise SystemExit("at least two uploads with rows are needed")
+
+    prefix = db.execute(
+        select(Prefix.path)
+        .join(PrefixRollup, PrefixRollup.prefix_id == Prefix.id)
+        .where(PrefixRollup.upload_uuid == uploads[0], Prefix.depth <= 1)
+        .order_by(Prefix.depth.desc(), PrefixRollup.row_count.desc())
+        .limit(1),
+    ).scalar_one()
+    return prefix, uploads
+
+
+def controller_calls(
+    prefix: str,
+    uploads: list[str],
+    since: datetime.datetime,
+) -> dict[str, Callable[[Session], object]]:
+    """Call every controller reading the database with the given arguments,
+    bypassing the result cache.
+    """
+    return {
+        "list_upload_times": lambda db: list_upload_times(db, prefix),
+        "get_all_uploads": lambda db: get_all_uploads(db, order_by="errors_total"),
+        "get_upload_diffs": lambda db: get_upload_diffs(db, prefix, uploads),
+        "compute_trend_chart": lambda db: _uncached(compute_trend_chart)(db, prefix),
+        "compute_trends": lambda db: _uncached(compute_trends)(db, prefix, "slope"),
+        "get_basic_stats": lambda db: _uncached(get_basic_stats)(
+            db,
+            prefix,
+            "median",
+            created_after=since,
+        ),
+        "get_basic_stats_chart": lambda db: _uncached(get_basic_stats_chart)(
+            db,
+            prefix,
+        ),
+        "compare_uploads": lambda db: compare_uploads(db, *uploads, prefix),
+        "get_prefix_autocomplete": lambda db: get_prefix_autocomplete(db, prefix),
+    }
+
+
+@contextmanager
+def _capture_queries(connection: Connection):
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        yield queries
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+
+def _seq_scans(plan: dict) -> list[tuple[str, float]]:
+    scans = []
+    if plan["Node Type"] == "Seq Scan":
+        scans.append((plan["Relation Name"], plan["Plan Rows"]))
+    for child in plan.get("Plans", []):
+        scans.extend(_seq_scans(child))
+    return scans
+
+
+def find_seq_scans(
+    db: Session,
+    calls: dict[str, Callable[[Session], object]],
+    min_rows: float = 0,
+) -> dict[str, list[tuple[str, float]]]:
+    """Run every call, EXPLAIN the queries it made and return, by call, the
+    sequential scans of relations estimated to hold at least `min_rows` rows,
+    with the number of rows the plan expects them to return.
+    """
+    connection = db.connection()
+    sizes = dict(
+        connection.execute(
+            text(
+                "SELECT relname, reltuples FROM pg_class "
+                "WHERE relkind IN ('r', 'p', 'm')",
+            ),
+        ).all(),
+    )
+    report = {}
+    for name, call in calls.items():
+        with _capture_queries(connection) as queries:
+            call(db)
+        report[name] = []
+        for statement, parameters in queries:
+            plan = connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}",
+                parameters,
+            ).scalar_one()
+            report[name].extend(
+                (relation, rows)
+                for relation, rows in _seq_scans(plan[0]["Plan"])
+                if sizes.get(relation, 0) >= min_rows
+            )
+    db.rollback()
+    return report
+
+
+if __name__ == "__main__":
+    from logstack.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Report the sequential scans in the plans of the controller "
+        "queries.",
+    )
+    parser.add_argument("--prefix", help="prefix filter of the queries")
+    parser.add_argument("--uploads", nargs=2, help="the uploads to compare")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        help="creation time range of the stats, in days back",
+    )
+    parser.add_argument(
+        "--min-rows",
+        type=float,
+        default=1000,
+        help="ignore scans of relations estimated to hold fewer rows",
+    )
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        prefix, uploads = representative_arguments(session)
+        prefix, uploads = args.prefix or prefix, args.uploads or uploads
+        since = datetime.datetime.now(datetime.UTC) - datetime.timedelta(args.days)
+        print(f"prefix {prefix!r}, uploads {uploads[0]} {uploads[1]}")
+        report = find_seq_scans(
+            session,
+            controller_calls(prefix, uploads, since),
+            args.min_rows,
+        )
+    finally:
+        session.close()
+
+    for name, scans in report.items():
+        if not scans:
+            print(f"{name}: no sequential scans")
+        for relation, rows in scans:
+            print(f"{name}: Seq Scan on {relation}, {rows:.0f} rows expected")
+    raise SystemExit(1 if any(report.values()) else 0)
@@ -0,0 +1,502 @@
+import datetime
+import hashlib
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from itertools import islice
+from typing import BinaryIO
+
+from pydantic import BaseModel
+from sqlalchemy import Connection, func, select, table, text, update
+from sqlalchemy.orm import Session
+
+from logstack.aggregates import (
+    add_error_count_sketches,
+    add_error_count_summaries,
+    add_prefix_diffs,
+    add_prefix_rollups,
+    add_trend_stats,
+)
+from logstack.cache import increment_data_version
+from logstack.constants import (
+    JOB_DUPLICATE,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+)
+from logstack.database import (
+    BulkCopyWriter,
+    SessionLocal,
+    engine,
+    escape_copy_text,
+)
+from logstack.database_models import Flamechart, IngestionJob, Upload
+from logstack.parsing import (
+    iter_lines,
+    open_decompressed,
+    parse_line,
+    read_range_lines,
+    split_ranges,
+)
+from logstack.partitions import ensure_partitions
+from logstack.prefixes import resolve_prefix_ids
+from logstack.settings import settings
+
+# parsed lines are COPYed here first, then moved into flamechart with prefix ids
+_STAGING_TABLE = table("flamechart_staging")
+_STAGING_COLUMNS = ("prefix", "error_count")
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.INGEST_WORKERS,
+    thread_name_prefix="ingest",
+)
+_parse_pool: ProcessPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
+
+# A job is held, from the spooling of its file to its removal, by a session
+# advisory lock of the process running it, taken on a connection of its own.
+# The jobs and spooled files whose lock is free were left behind by a process
+# that exited, see recover_interrupted_jobs.
+_JOB_LOCK_CLASS = 0x6A6F62
+_job_lock_connection: Connection | None = None
+_job_lock_mutex = threading.Lock()
+
+
+class UploadMetadata(BaseModel):
+    upload_uuid: str
+    filename: str
+    from_date: datetime.date
+    to_date: datetime.date
+    environment: str | None
+    created_at: datetime.datetime
+    compression: str | None = None
+    content_hash: str | None = None
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.UTC)
+
+
+def _job_lock(function, job_id: str):
+    return select(function(_JOB_LOCK_CLASS, func.hashtext(job_id)))
+
+
+def _hold_job(job_id: str) -> None:
+    global _job_lock_connection
+    with _job_lock_mutex:
+        if _job_lock_connection is None:
+            _job_lock_connection = engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT",
+            )
+        _job_lock_connection.execute(_job_lock(func.pg_advisory_lock, job_id))
+
+
+def _release_job(job_id: str) -> None:
+    with _job_lock_mutex:
+        _job_lock_connection.execute(_job_lock(func.pg_advisory_unlock, job_id))
+
+
+def _spool_path(job_id: str) -> str:
+    return os.path.join(settings.SPOOL_DIR, f"{job_id}.upload")
+
+
+def spool_upload(stream: BinaryIO, job_id: str) -> tuple[str, str]:
+    """Copy an uploaded file, as received, to the spool directory and hold the
+    job it is uploaded for until `release_spool`.
+
+    Returns the spooled path and the SHA-256 of the content. Compressed uploads
+    are decompressed later, while they are parsed.
+    """
+    digest = hashlib.sha256()
+    os.makedirs(settings.SPOOL_DIR, exist_ok=True)
+    path = _spool_path(job_id)
+    _hold_job(job_id)
+    try:
+        with open(path, "wb") as spool:
+            while chunk := stream.read(settings.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        release_spool(job_id, path)
+        raise
+    return path, digest.hexdigest()
+
+
+def release_spool(job_id: str, path: str) -> None:
+    """Remove a spooled file and let go of its job."""
+    try:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+    finally:
+        _release_job(job_id)
+
+
+def find_duplicate_upload(db: Session, upload: UploadMetadata) -> Upload | None:
+    """Find an upload of the same content for the same dates and environment."""
+    if upload.content_hash is None:
+        return None
+
+    return (
+        db.query(Upload)
+        .filter(
+            Upload.content_hash == upload.content_hash,
+            Upload.from_date == upload.from_date,
+            Upload.to_date == upload.to_date,
+            Upload.environment.is_not_distinct_from(upload.environment),
+        )
+        .first()
+    )
+
+
+def record_upload(
+    db: Session,
+    upload: UploadMetadata,
+    row_count: int,
+    errors_total: int,
+) -> None:
+    db.add(
+        Upload(
+            upload_uuid=upload.upload_uuid,
+            filename=upload.filename,
+            environment=upload.environment,
+            content_hash=upload.content_hash,
+            from_date=upload.from_date,
+            to_date=upload.to_date,
+            created_at=upload.created_at,
+            row_count=row_count,
+            errors_total=errors_total,
+        ),
+    )
+
+
+def _render_row(prefix: str, error_count: int) -> str:
+    return f"{escape_copy_text(prefix)}\t{error_count}\n"
+
+
+def _parse_range(path: str, start: int, end: int) -> tuple[int, int, str]:
+    """Parse one byte range of a spooled file into COPY text.
+
+    Runs in a parse process and returns the number of lines parsed, the number
+    of rows and the rows rendered for COPY.
+    """
+    lines = read_range_lines(path, start, end, settings.UPLOAD_MAX_LINE_LENGTH)
+    rows = []
+    for line in lines:
+        record = parse_line(line)
+        if record is not None:
+            rows.append(_render_row(*record))
+    return len(lines), len(rows), "".join(rows)
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=settings.INGEST_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _load_sequential(
+    writer: BulkCopyWriter,
+    path: str,
+    upload: UploadMetadata,
+    on_progress: Callable[[int, int], None] | None,
+) -> int:
+    lines_parsed = 0
+    with open_decompressed(path, upload.compression) as stream:
+        for line in iter_lines(
+            stream,
+            settings.UPLOAD_CHUNK_SIZE,
+            settings.UPLOAD_MAX_LINE_LENGTH,
+        ):
+            lines_parsed += 1
+            if on_progress is not None and lines_parsed % writer.batch_size == 0:
+                on_progress(lines_parsed, writer.rows_written)
+
+            record = parse_line(line)
+            if record is not None:
+                writer.add_copy_line(_render_row(*record))
+    return lines_parsed
+
+
+def _load_parallel(
+    writer: BulkCopyWriter,
+    path: str,
+    on_progress: Callable[[int, int], None] | None,
+) -> int:
+    """Parse line-aligned byte ranges in the process pool and COPY each parsed
+    range, in file order, while the following ranges are being parsed.
+    """
+    pool = _get_parse_pool()
+    ranges = iter(split_ranges(path, settings.INGEST_RANGE_SIZE))
+    # bound the number of parsed ranges held in memory
+    in_flight = deque(
+        pool.submit(_parse_range, path, start, end)
+        for start, end in islice(ranges, 2 * settings.INGEST_PARSE_PROCESSES)
+    )
+    lines_parsed = 0
+    try:
+        while in_flight:
+            lines, rows, text = in_flight.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                in_flight.append(pool.submit(_parse_range, path, *next_range))
+
+            writer.add_copy_text(text, rows)
+            lines_parsed += lines
+            if on_progress is not None:
+                on_progress(lines_parsed, writer.rows_written)
+    finally:
+        for future in in_flight:
+            future.cancel()
+    return lines_parsed
+
+
+def load_upload(
+    db: Session,
+    path: str,
+    upload: UploadMetadata,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> tuple[int, int, int]:
+    """Parse a spooled collapsed stack file and load its rows into flamechart.
+
+    The parsed lines are COPYed into a temporary staging table, their prefixes
+    are added to the prefix table and the rows are then inserted with their
+    prefix ids and added to the prefix rollups, diffs, trend statistics and
+    error count sketches and summaries.
+    Returns the number of lines parsed, the number of rows written and the sum
+    of their error counts. Nothing is committed.
+    """
+    ensure_partitions(db, [upload.created_at])
+    db.execute(
+        text(
+            "CREATE TEMPORARY TABLE flamechart_staging "
+            "(prefix varchar NOT NULL, error_count integer NOT NULL) "
+            "ON COMMIT DROP",
+        ),
+    )
+    with BulkCopyWriter(db, _STAGING_TABLE, _STAGING_COLUMNS) as writer:
+        # compressed files cannot be split into ranges, they are streamed instead
+        if settings.INGEST_PARSE_PROCESSES > 1 and upload.compression is None:
+            lines_parsed = _load_parallel(writer, path, on_progress)
+        else:
+            lines_parsed = _load_sequential(writer, path, upload, on_progress)
+
+    resolve_prefix_ids(
+        db,
+        db.execute(text("SELECT DISTINCT prefix FROM flamechart_staging")).scalars(),
+    )
+    db.execute(
+        text(
+            "INSERT INTO flamechart (upload_uuid, filename, from_date, to_date, "
+            "created_at, environment, prefix_id, error_count) "
+            "SELECT :upload_uuid, :filename, :from_date, :to_date, :created_at, "
+            ":environment, prefix.id, staging.error_count "
+            "FROM flamechart_staging AS staging "
+            "JOIN prefix ON prefix.path = staging.prefix",
+        ),
+        {
+            "upload_uuid": upload.upload_uuid,
+            "filename": upload.filename,
+            "from_date": upload.from_date,
+            "to_date": upload.to_date,
+            "created_at": upload.created_at,
+            "environment": upload.environment,
+        },
+    )
+    add_prefix_rollups(db, Flamechart.upload_uuid == upload.upload_uuid)
+    add_prefix_diffs(db, Flamechart.upload_uuid == upload.upload_uuid)
+    add_trend_stats(db, Flamechart.upload_uuid == upload.upload_uuid)
+    add_error_count_sketches(db, Flamechart.upload_uuid == upload.upload_uuid)
+    add_error_count_summaries(db, Flamechart.upload_uuid == upload.upload_uuid)
+    errors_total = db.execute(
+        text("SELECT coalesce(sum(error_count), 0) FROM flamechart_staging"),
+    ).scalar_one()
+    return lines_parsed, writer.rows_written, errors_total
+
+
+def create_job(
+    db: Session,
+    upload: UploadMetadata,
+    job_id: str | None = None,
+    duplicate_of: Upload | None = None,
+) -> IngestionJob:
+    """Record a queued job for `upload`, or a finished one pointing at the
+    existing upload when it is a duplicate.
+    """
+    job = IngestionJob(
+        id=job_id or str(uuid.uuid4()),
+        status=JOB_QUEUED,
+        filename=upload.filename,
+        upload_uuid=upload.upload_uuid,
+        lines_parsed=0,
+        rows_written=0,
+        created_at=upload.created_at,
+    )
+    if duplicate_of is not None:
+        job.status = JOB_DUPLICATE
+        job.upload_uuid = duplicate_of.upload_uuid
+        job.finished_at = upload.created_at
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _update_job(job_id: str, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IngestionJob).filter(IngestionJob.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_upload_job(job_id: str, path: str, upload: UploadMetadata) -> None:
+    db = SessionLocal()
+    try:
+        _update_job(job_id, status=JOB_RUNNING, started_at=_now())
+        # serialize jobs loading the same content so only one of them wins
+        db.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(upload.content_hash)))
+        )
+        duplicate = find_duplicate_upload(db, upload)
+        if duplicate is not None:
+            db.rollback()
+            _update_job(
+                job_id,
+                status=JOB_DUPLICATE,
+                upload_uuid=duplicate.upload_uuid,
+                finished_at=_now(),
+            )
+            return
+
+        lines_parsed, rows_written, errors_total = load_upload(
+            db,
+            path,
+            upload,
+            lambda lines, rows: _update_job(
+                job_id,
+                lines_parsed=lines,
+                rows_written=rows,
+            ),
+        )
+        record_upload(db, upload, rows_written, errors_total)
+        increment_data_version(db)
+        db.commit()
+    # any failure is the job's to report, nobody else waits on it
+    except Exception as exc:  # noqa: BLE001
+        db.rollback()
+        _update_job(job_id, status=JOB_FAILED, error=str(exc), finished_at=_now())
+        return
+    finally:
+        db.close()
+        release_spool(job_id, path)
+
+    _update_job(
+        job_id,
+        status=JOB_SUCCEEDED,
+        lines_parsed=lines_parsed,
+        rows_written=rows_written,
+        finished_at=_now(),
+    )
+
+
+def submit_upload_job(job_id: str, path: str, upload: UploadMetadata) -> None:
+    _executor.submit(run_upload_job, job_id, path, upload)
+
+
+def recover_interrupted_jobs() -> int:
+    """Fail the queued and running jobs of processes that exited before
+    finishing them and remove the files spooled for them.
+
+    Returns the number of jobs failed.
+    """
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT",
+    ) as connection:
+        unfinished = {
+            str(job_id)
+            for job_id in connection.execute(
+                select(IngestionJob.id).where(
+                    IngestionJob.status.in_((JOB_QUEUED, JOB_RUNNING)),
+                ),
+            ).scalars()
+        }
+        spooled = set()
+        if os.path.isdir(settings.SPOOL_DIR):
+            spooled = {
+                name.removesuffix(".upload")
+                for name in os.listdir(settings.SPOOL_DIR)
+                if name.endswith(".upload")
+            }
+
+        failed = 0
+        for job_id in unfinished | spooled:
+            if not connection.execute(
+                _job_lock(func.pg_try_advisory_lock, job_id),
+            ).scalar_one():
+                continue
+            try:
+                with suppress(FileNotFoundError):
+                    os.remove(_spool_path(job_id))
+                if job_id not in unfinished:
+                    continue
+                # it may have finished since it was read
+                failed += connection.execute(
+                    update(IngestionJob)
+                    .where(
+                        IngestionJob.id == job_id,
+                        IngestionJob.status.in_((JOB_QUEUED, JOB_RUNNING)),
+                    )
+                    .values(
+                        status=JOB_FAILED,
+                        error="interrupted by a restart",
+                        finished_at=_now(),
+                    ),
+                ).rowcount
+            finally:
+                connection.execute(_job_lock(func.pg_advisory_unlock, job_id))
+    return failed
+
+
+def shutdown_jobs() -> None:
+    global _job_lock_connection
+    _executor.shutdown(wait=True)
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=True)
+    with _job_lock_mutex:
+        if _job_lock_connection is not None:
+            _job_lock_connection.close()
+            _job_lock_connection = None
+
+
+def job_status(job: IngestionJob) -> dict:
+    rows_per_second = None
+    if job.started_at is not None:
+        finished_at = job.finished_at or _now().replace(tzinfo=None)
+        elapsed = (finished_at - job.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_second = job.rows_written / elapsed
+
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "filename": job.filename,
+        "upload_uuid": str(job.upload_uuid),
+        "lines_parsed": job.lines_parsed,
+        "rows_written": job.rows_written,
+        "rows_per_second": rows_per_second,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -1,18 +1,39 @@
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 from logstack.api.analytics import comparison_router
 from logstack.api.ingestion import ingestion_router
+from logstack.api.metrics import metrics_router
+from logstack.database import async_engine, async_read_engine
+from logstack.events import event_buffer
+from logstack.jobs import recover_interrupted_jobs, shutdown_jobs
+from logstack.partitions import create_upcoming_partitions
 
 templates = Jinja2Templates("templates")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with async_engine.begin() as connection:
+        await connection.run_sync(create_upcoming_partitions)
+    await run_in_threadpool(recover_interrupted_jobs)
+    yield
+    await event_buffer.close()
+    shutdown_jobs()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(ingestion_router, prefix="/api")
 app.include_router(comparison_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
@@ -0,0 +1,148 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+from collections.abc import Callable, Sequence
+from decimal import Decimal
+from numbers import Number
+
+from sqlalchemy import ColumnElement, and_, false, or_, tuple_
+from sqlalchemy.orm import Query
+
+# type tags of the values stored in a cursor, looked up along the type's MRO
+_ENCODERS = {
+    type(None): ("n", lambda value: None),
+    bool: ("b", bool),
+    int: ("i", int),
+    float: ("f", float),
+    str: ("s", str),
+    Decimal: ("d", str),
+    datetime.datetime: ("t", datetime.datetime.isoformat),
+    datetime.date: ("D", datetime.date.isoformat),
+    uuid.UUID: ("u", str),
+}
+_DECODERS = {
+    "n": lambda value: None,
+    "b": bool,
+    "i": int,
+    "f": float,
+    "s": str,
+    "d": Decimal,
+    "t": datetime.datetime.fromisoformat,
+    "D": datetime.date.fromisoformat,
+    "u": uuid.UUID,
+}
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor is malformed or belongs to another ordering."""
+
+
+def encode_cursor(ordering: str, values: Sequence) -> str:
+    """Encode the ordering key of the last row of a page as an opaque token."""
+    tagged = []
+    for value in values:
+        # drivers may return subclasses, asyncpg has its own UUID
+        kind = next((kind for kind in type(value).__mro__ if kind in _ENCODERS), None)
+        if kind is None:
+            raise TypeError(f"cannot store {type(value).__name__} in a cursor")
+        tag, encode = _ENCODERS[kind]
+        tagged.append([tag, encode(value)])
+    payload = json.dumps({"o": ordering, "v": tagged}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(ordering: str, cursor: str) -> list:
+    """Decode a token made by `encode_cursor` for the same ordering."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        owner = payload["o"]
+        values = [_DECODERS[tag](value) for tag, value in payload["v"]]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise InvalidCursorError("malformed cursor") from None
+
+    if owner != ordering:
+        raise InvalidCursorError("cursor belongs to another ordering")
+    return values
+
+
+def _fits(key: ColumnElement, value) -> bool:
+    """Whether a decoded cursor value can be compared with its key."""
+    if value is None:
+        return True
+    try:
+        expected = key.type.python_type
+    except NotImplementedError:
+        return True
+    if issubclass(expected, bool) or isinstance(value, bool):
+        return isinstance(value, expected)
+    # the database compares any numbers, the drivers return them in any type
+    if issubclass(expected, Number):
+        return isinstance(value, Number)
+    return isinstance(value, expected)
+
+
+def _after(
+    keys: Sequence[ColumnElement],
+    values: Sequence,
+    descending: bool,
+) -> ColumnElement:
+    """Condition of the rows following `values` in the order of `keys`.
+
+    A row comparison is used unless a key may be NULL, since it is never true
+    for a NULL. NULLs are ordered like PostgreSQL does by default: last when
+    ascending, first when descending.
+    """
+    if not any(getattr(key, "nullable", True) for key in keys):
+        after, values = tuple_(*keys), tuple_(*values)
+        return after < values if descending else after > values
+
+    conditions = []
+    equal = []
+    for key, value in zip(keys, values):
+        if value is None:
+            beyond = key.is_not(None) if descending else false()
+        elif descending:
+            beyond = key < value
+        else:
+            beyond = or_(key > value, key.is_(None))
+        conditions.append(and_(*equal, beyond))
+        equal.append(key.is_(None) if value is None else key == value)
+    return or_(*conditions)
+
+
+def paginate(
+    query: Query,
+    keys: Sequence[ColumnElement],
+    key_of: Callable[[object], tuple],
+    ordering: str,
+    descending: bool = False,
+    cursor: str | None = None,
+    page: int = 1,
+    page_size: int = 50,
+) -> tuple[list, str | None]:
+    """Order `query` by `keys` and return one page of rows and the cursor of
+    the next page, or None on the last page.
+
+    `keys` must identify a row uniquely and `key_of` returns their values for a
+    result row. With a cursor, the page starts right after the row it was made
+    from, which spares skipping the rows before it. Without one, `page` is
+    used as an offset.
+    """
+    if cursor is not None:
+        values = decode_cursor(ordering, cursor)
+        if len(values) != len(keys) or not all(map(_fits, keys, values)):
+            raise InvalidCursorError("malformed cursor")
+        query = query.filter(_after(keys, values, descending))
+
+    query = query.order_by(*(key.desc() if descending else key.asc() for key in keys))
+    if cursor is None:
+        query = query.offset((page - 1) * page_size)
+    rows = query.limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    return rows, encode_cursor(ordering, key_of(rows[-1]))
@@ -0,0 +1,156 @@
+import gzip
+import os
+from collections.abc import Iterator
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+_MAGIC_BYTES = {
+    b"\x1f\x8b": GZIP,
+    b"\x28\xb5\x2f\xfd": ZSTD,
+}
+_CONTENT_TYPES = {
+    "application/gzip": GZIP,
+    "application/x-gzip": GZIP,
+    "application/zstd": ZSTD,
+    "application/x-zstd": ZSTD,
+}
+
+
+class LineTooLongError(ValueError):
+    """Raised when an input line exceeds the configured maximum length."""
+
+
+class LineSplitter:
+    """Split a stream of byte chunks into lines.
+
+    Only the trailing, not yet terminated part of the last chunk is kept between
+    calls, so memory is bounded by the chunk size plus the maximum line length.
+    """
+
+    def __init__(self, max_line_length: int):
+        self.max_line_length = max_line_length
+        self._tail = b""
+
+    def _check(self, line: bytes) -> None:
+        if len(line) > self.max_line_length:
+            raise LineTooLongError(
+                f"line exceeds the maximum length of {self.max_line_length} bytes",
+            )
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        self._check(self._tail)
+        for line in lines:
+            self._check(line)
+        return lines
+
+    def close(self) -> list[bytes]:
+        tail, self._tail = self._tail, b""
+        return [tail] if tail else []
+
+
+def iter_lines(
+    stream: BinaryIO,
+    chunk_size: int,
+    max_line_length: int,
+) -> Iterator[bytes]:
+    """Yield lines of a binary stream, reading it in chunks of `chunk_size`."""
+    splitter = LineSplitter(max_line_length)
+    while chunk := stream.read(chunk_size):
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+class UnsupportedCompressionError(ValueError):
+    """Raised when an upload is compressed with a codec that is not available."""
+
+
+def detect_compression(content_type: str | None, head: bytes) -> str | None:
+    """Detect the compression of an upload from its magic bytes or content type."""
+    for magic, compression in _MAGIC_BYTES.items():
+        if head.startswith(magic):
+            break
+    else:
+        compression = _CONTENT_TYPES.get((content_type or "").split(";")[0].strip())
+
+    if compression == ZSTD and zstandard is None:
+        raise UnsupportedCompressionError(
+            "zstd compressed uploads require the 'zstandard' package",
+        )
+    return compression
+
+
+def open_decompressed(path: str, compression: str | None) -> BinaryIO:
+    """Open a spooled upload as a stream of decompressed bytes."""
+    if compression == GZIP:
+        return gzip.open(path, "rb")
+    if compression == ZSTD:
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"),
+            read_across_frames=True,
+        )
+    return open(path, "rb")
+
+
+def split_ranges(path: str, range_size: int) -> list[tuple[int, int]]:
+    """Split a file into byte ranges of roughly `range_size` bytes.
+
+    Every range but the first starts right after a newline and every range but
+    the last ends right after one, so each line falls in exactly one range.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, "rb") as stream:
+        while start < size:
+            end = start + range_size
+            if end < size:
+                stream.seek(end)
+                stream.readline()
+                end = stream.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range_lines(
+    path: str,
+    start: int,
+    end: int,
+    max_line_length: int,
+) -> list[bytes]:
+    with open(path, "rb") as stream:
+        stream.seek(start)
+        data = stream.read(end - start)
+    splitter = LineSplitter(max_line_length)
+    return splitter.feed(data) + splitter.close()
+
+
+def parse_line(line: bytes) -> tuple[str, int] | None:
+    """Parse a collapsed stack line (`a;b;c 42`) into a prefix and an error count.
+
+    Returns None for blank lines and lines without a count.
+    """
+    line = line.decode().strip()
+    if not line:
+        return None
+
+    parts = line.rsplit(" ", 1)
+    if len(parts) != 2:
+        return None
+
+    prefix_raw = parts[0].replace(";", "/")
+    if prefix_raw.startswith("//"):
+        prefix_raw = prefix_raw[1:]
+
+    return prefix_raw, int(parts[1])
@@ -0,0 +1,183 @@
+import datetime
+import re
+from collections.abc import Iterable
+
+from sqlalchemy import Connection, and_, func, select, text
+from sqlalchemy.orm import Session
+
+from logstack.aggregates import fold_error_count_sketches, fold_flamechart_rows
+from logstack.database_models import ErrorCountSketch, Flamechart
+from logstack.settings import settings
+
+# flamechart is range partitioned by month of created_at, one partition per month
+_PARTITION_NAME = re.compile(r"^flamechart_p(\d{4})_(\d{2})$")
+# serializes the processes creating and dropping partitions
+_LOCK_ID = 0x666C616D
+
+# months whose partitions this process knows to exist
+_known_months: set[datetime.date] = set()
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"flamechart_p{month:%Y_%m}"
+
+
+def is_partition(name: str) -> bool:
+    """Whether `name` is a flamechart partition managed by this module."""
+    return _PARTITION_NAME.match(name) is not None
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def list_partitions(connection: Connection) -> dict[datetime.date, str]:
+    """Return the managed partitions of flamechart by the month they hold."""
+    names = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'flamechart'::regclass",
+        ),
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match is not None:
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partitions(connection: Connection, months: Iterable[datetime.date]) -> None:
+    """Create the partitions of `months` that do not exist yet.
+
+    Creating a partition locks flamechart exclusively, so the caller should
+    commit right after instead of holding the lock in a longer transaction.
+    """
+    months = set(months)
+    connection.execute(select(func.pg_advisory_xact_lock(_LOCK_ID)))
+    existing = list_partitions(connection)
+    for month in sorted(months):
+        if month not in existing:
+            connection.execute(
+                text(
+                    f"CREATE TABLE {partition_name(month)} PARTITION OF flamechart "
+                    f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')",
+                ),
+            )
+    _known_months.update(existing)
+    _known_months.update(months)
+
+
+def create_upcoming_partitions(
+    connection: Connection,
+    now: datetime.datetime | None = None,
+) -> None:
+    """Create the partition of the current month and of the
+    FLAMECHART_PARTITIONS_AHEAD months after it.
+    """
+    current = month_start(now or _utcnow())
+    create_partitions(
+        connection,
+        [
+            add_months(current, months)
+            for months in range(settings.FLAMECHART_PARTITIONS_AHEAD + 1)
+        ],
+    )
+
+
+def ensure_partitions(db: Session, created_at: Iterable[datetime.datetime]) -> None:
+    """Make sure rows created at these times have a partition to go to.
+
+    Missing partitions are created in a transaction of their own, on another
+    connection of the session's engine, before the session writes any rows.
+    """
+    months = {month_start(value) for value in created_at} - _known_months
+    if months:
+        with db.get_bind().begin() as connection:
+            create_partitions(connection, months)
+
+
+def drop_expired_partitions(
+    db: Session,
+    retention_months: int,
+    now: datetime.datetime | None = None,
+) -> list[str]:
+    """Fold the rows of the partitions older than `retention_months` full
+    months into flamechart_rollup, then detach and drop the partitions and
+    return their names.
+
+    The rollups, diffs, trend statistics and error count sketches of the
+    prefixes and the totals of the uploads keep counting the folded rows.
+    Every partition is folded in a transaction of its own and they are only
+    dropped, together, at the end, so flamechart is not locked while rows are
+    folded.
+    """
+    cutoff = add_months(month_start(now or _utcnow()), -retention_months)
+    expired = sorted(
+        (month, name)
+        for month, name in list_partitions(db.connection()).items()
+        if add_months(month, 1) <= cutoff
+    )
+    for month, _ in expired:
+        fold_flamechart_rows(
+            db,
+            and_(
+                Flamechart.created_at >= month,
+                Flamechart.created_at < add_months(month, 1),
+            ),
+            settings.COMPACTION_PERIOD,
+        )
+        fold_error_count_sketches(
+            db,
+            and_(
+                ErrorCountSketch.created_at >= month,
+                ErrorCountSketch.created_at < add_months(month, 1),
+            ),
+            settings.COMPACTION_PERIOD,
+        )
+        db.commit()
+
+    connection = db.connection()
+    connection.execute(select(func.pg_advisory_xact_lock(_LOCK_ID)))
+    for month, name in expired:
+        connection.execute(text(f"ALTER TABLE flamechart DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+        _known_months.discard(month)
+    db.commit()
+    return [name for _, name in expired]
+
+
+def maintain_partitions(db: Session) -> list[str]:
+    """Create the upcoming partitions and, when FLAMECHART_RETENTION_MONTHS is
+    set, drop the expired ones. Returns the names of the dropped partitions.
+    """
+    create_upcoming_partitions(db.connection())
+    db.commit()
+    if not settings.FLAMECHART_RETENTION_MONTHS:
+        return []
+    return drop_expired_partitions(db, settings.FLAMECHART_RETENTION_MONTHS)
+
+
+if __name__ == "__main__":
+    from logstack.cache import bump_data_version
+    from logstack.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        dropped = maintain_partitions(session)
+        if dropped:
+            bump_data_version(session)
+        for name in dropped:
+            print(f"dropped {name}")
+    finally:
+        session.close()
@@ -0,0 +1,82 @@
+from collections.abc import Iterable
+
+from sqlalchemy import String, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+
+from logstack.database_models import Prefix
+from logstack.settings import settings
+
+# path -> id of prefixes known to be committed
+_known_ids: dict[str, int] = {}
+
+
+def ancestor_paths(path: str) -> list[str]:
+    """Return the ancestors of a stack path followed by the path itself.
+
+    The position of a path in the list is its depth, `/a/b/c` gives
+    `["/a", "/a/b", "/a/b/c"]`.
+    """
+    parts = path.split("/")
+    ancestors = ("/".join(parts[:n]) for n in range(1, len(parts)))
+    return [ancestor for ancestor in ancestors if ancestor] + [path]
+
+
+def _select_ids(db: Session, paths: list[str]) -> dict[str, int]:
+    query = select(Prefix.path, Prefix.id).where(
+        Prefix.path == any_(bindparam("paths", paths, type_=ARRAY(String))),
+    )
+    return dict(db.execute(query).all())
+
+
+def resolve_prefix_ids(db: Session, paths: Iterable[str]) -> dict[str, int]:
+    """Return the ids of the given paths, creating them and their ancestors in the
+    prefix table when they do not exist yet.
+
+    New prefixes are inserted inside the caller's transaction, level by level
+    so every parent exists before its children.
+    """
+    ids = {}
+    missing = set()
+    for path in paths:
+        if path in _known_ids:
+            ids[path] = _known_ids[path]
+        else:
+            missing.add(path)
+    if not missing:
+        return ids
+
+    depths = {}
+    for path in missing:
+        for depth, ancestor in enumerate(ancestor_paths(path)):
+            depths[ancestor] = depth
+
+    known = _select_ids(db, list(depths))
+    if len(_known_ids) + len(known) > settings.PREFIX_CACHE_SIZE:
+        _known_ids.clear()
+    _known_ids.update(known)
+
+    levels: dict[int, list[str]] = {}
+    for path, depth in depths.items():
+        if path not in known:
+            levels.setdefault(depth, []).append(path)
+
+    for depth in sorted(levels):
+        rows = [
+            {
+                "path": path,
+                "depth": depth,
+                "parent_id": known[path.rsplit("/", 1)[0]] if depth else None,
+            }
+            # sorted, so concurrent loaders lock new rows in the same order
+            for path in sorted(levels[depth])
+        ]
+        statement = insert(Prefix).on_conflict_do_update(
+            index_elements=[Prefix.path],
+            set_={"depth": depth},
+        )
+        result = db.execute(statement.returning(Prefix.path, Prefix.id), rows)
+        known.update(result.all())
+
+    ids.update((path, known[path]) for path in missing)
+    return ids
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from pydantic import BaseModel
 
@@ -9,6 +10,76 @@ class Settings(BaseModel):
     POSTGRES_USER: str = os.environ.get("POSTGRES_USER", "user")
     POSTGRES_PASSWORD: str = os.environ.get("POSTGRES_PASSWORD", "password")
     POSTGRES_DATABASE: str = os.environ.get("POSTGRES_DATABASE", "flamecharts")
+    # Optional DSN of a read-only replica, the analytics routes query it instead
+    # of the primary.
+    POSTGRES_READ_URL: str | None = os.environ.get("POSTGRES_READ_URL") or None
+
+    # Per engine and process; POOL_TIMEOUT is how long a request waits for a
+    # free connection, in seconds.
+    POSTGRES_POOL_SIZE: int = int(os.environ.get("POSTGRES_POOL_SIZE", "5"))
+    POSTGRES_MAX_OVERFLOW: int = int(os.environ.get("POSTGRES_MAX_OVERFLOW", "10"))
+    POSTGRES_POOL_TIMEOUT: float = float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30"))
+    POSTGRES_POOL_RECYCLE: int = int(os.environ.get("POSTGRES_POOL_RECYCLE", "-1"))
+    # Limit of the queries run by requests, in milliseconds; 0 disables it.
+    # Upload jobs and maintenance commands are not limited.
+    POSTGRES_STATEMENT_TIMEOUT_MS: int = int(
+        os.environ.get("POSTGRES_STATEMENT_TIMEOUT_MS", "0"),
+    )
+
+    UPLOAD_CHUNK_SIZE: int = int(os.environ.get("UPLOAD_CHUNK_SIZE", "1048576"))
+    UPLOAD_MAX_LINE_LENGTH: int = int(
+        os.environ.get("UPLOAD_MAX_LINE_LENGTH", "65536"),
+    )
+    INGEST_BATCH_SIZE: int = int(os.environ.get("INGEST_BATCH_SIZE", "10000"))
+    INGEST_WORKERS: int = int(os.environ.get("INGEST_WORKERS", "2"))
+    # Parse spooled uploads in this many processes; 0 or 1 parses in the job thread.
+    INGEST_PARSE_PROCESSES: int = int(os.environ.get("INGEST_PARSE_PROCESSES", "0"))
+    INGEST_RANGE_SIZE: int = int(os.environ.get("INGEST_RANGE_SIZE", "8388608"))
+    PREFIX_CACHE_SIZE: int = int(os.environ.get("PREFIX_CACHE_SIZE", "100000"))
+    # Entries of the analytics result cache; 0 disables it. A TTL of 0 keeps
+    # entries until they are evicted or the data changes.
+    RESULT_CACHE_SIZE: int = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+    RESULT_CACHE_TTL_SECONDS: float = float(
+        os.environ.get("RESULT_CACHE_TTL_SECONDS", "0"),
+    )
+    # Rows fetched per round trip when a response is streamed as NDJSON.
+    STREAM_BATCH_SIZE: int = int(os.environ.get("STREAM_BATCH_SIZE", "1000"))
+    # Monthly flamechart partitions created ahead of the current month.
+    FLAMECHART_PARTITIONS_AHEAD: int = int(
+        os.environ.get("FLAMECHART_PARTITIONS_AHEAD", "1"),
+    )
+    # `python -m logstack.partitions` folds the rows of the flamechart partitions
+    # older than this many full months into flamechart_rollup and drops the
+    # partitions; 0 keeps every partition.
+    FLAMECHART_RETENTION_MONTHS: int = int(
+        os.environ.get("FLAMECHART_RETENTION_MONTHS", "0"),
+    )
+    # `python -m logstack.compaction` folds the flamechart rows older than this
+    # into one rollup per prefix, environment and period ("day" or "week").
+    COMPACTION_AGE_DAYS: int = int(os.environ.get("COMPACTION_AGE_DAYS", "90"))
+    COMPACTION_PERIOD: str = os.environ.get("COMPACTION_PERIOD", "day")
+    SPOOL_DIR: str = os.environ.get(
+        "SPOOL_DIR",
+        os.path.join(tempfile.gettempdir(), "logstack"),
+    )
+
+    EVENT_BUFFER_ENABLED: bool = os.environ.get(
+        "EVENT_BUFFER_ENABLED",
+        "false",
+    ).lower() in ("1", "true", "yes")
+    EVENT_BUFFER_MAX_SIZE: int = int(os.environ.get("EVENT_BUFFER_MAX_SIZE", "500"))
+    EVENT_BUFFER_MAX_LATENCY_MS: int = int(
+        os.environ.get("EVENT_BUFFER_MAX_LATENCY_MS", "50"),
+    )
+    # When non-zero, events with the same key are stored as one row whose error
+    # count is the sum of theirs: the events of one /events request and, only
+    # with EVENT_BUFFER_ENABLED, the buffered /event events, which the buffer
+    # then holds for this long instead of the latency above. The analytics see
+    # the merged row, not the events: totals are kept, but the row counts, the
+    # mean, quantiles, deviation, minimum and maximum and the trends change.
+    EVENT_COALESCE_WINDOW_MS: int = int(
+        os.environ.get("EVENT_COALESCE_WINDOW_MS", "0"),
+    )
 
 
 settings = Settings()
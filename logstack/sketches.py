@@ -0,0 +1,29 @@
+import math
+
+from sqlalchemy import ColumnElement, Float, SmallInteger, case, cast, func
+
+# Error count sketches in the manner of DDSketch: counts of the values falling
+# in logarithmically sized buckets. Positive values in (GAMMA ** (k - 1),
+# GAMMA ** k] go to bucket k + 1, zero to bucket 0 and negative values to the
+# bucket of their absolute value, negated, so the buckets are ordered like the
+# values. Sketches are merged by adding the counts of equal buckets, and a
+# quantile read off the merged counts is within RELATIVE_ACCURACY of the exact
+# value of its rank. The stored buckets depend on it, so changing it requires
+# rebuilding the sketches.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+
+def bucket_of(value: ColumnElement) -> ColumnElement:
+    """SQL expression of the bucket `value` falls in."""
+    magnitude = func.ceil(func.ln(func.abs(cast(value, Float))) / _LOG_GAMMA) + 1
+    return cast(
+        case((value > 0, magnitude), (value < 0, -magnitude), else_=0), SmallInteger
+    )
+
+
+def bucket_value(bucket: ColumnElement) -> ColumnElement:
+    """SQL expression of the value standing for every value of `bucket`."""
+    magnitude = 2 * func.power(cast(GAMMA, Float), func.abs(bucket) - 1) / (GAMMA + 1)
+    return case((bucket > 0, magnitude), (bucket < 0, -magnitude), else_=0.0)
@@ -0,0 +1,67 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def group_trends(
+    keys: np.ndarray,
+    order: np.ndarray | None,
+    values: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fit a line to every group of `values` in one pass.
+
+    A group is a run of equal consecutive `keys`. Within a group the values are
+    ordered by `order` (stably), or kept in input order when `order` is None,
+    and fitted against their rank 0..n-1 with least squares, like
+    `np.polyfit(range(n), values, 1)`. Groups of fewer than two values get the
+    slope 1 and the intercept 0.
+
+    Returns the index of the first row, the slope and the intercept of every
+    group.
+    """
+    if not len(keys):
+        return np.empty(0, dtype=np.intp), np.empty(0), np.empty(0)
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    if order is not None:
+        # lexsort is stable, so ties in `order` keep their input order
+        values = values[np.lexsort((order, np.repeat(np.arange(len(starts)), counts)))]
+    y = values.astype(np.float64)
+    x = np.arange(len(keys)) - np.repeat(starts, counts)
+
+    n = counts.astype(np.float64)
+    sum_y = np.add.reduceat(y, starts)
+    sum_xy = np.add.reduceat(x * y, starts)
+    # x is 0..n-1 in every group, so its sums have closed forms
+    mean_x = (n - 1) / 2
+    var_x = n * (n * n - 1) / 12
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = (sum_xy - mean_x * sum_y) / var_x
+        intercepts = sum_y / n - slopes * mean_x
+
+    single = counts < 2
+    slopes[single] = 1
+    intercepts[single] = 0
+    return starts, slopes, intercepts
+
+
+def calculate_trends(
+    rows: Sequence,
+    group_by: str,
+    sorting_key: str,
+) -> list[tuple[str, tuple[float, float]]]:
+    """Fit the error counts of consecutive rows with the same `group_by`
+    attribute, ordered by `sorting_key`.
+    """
+    if not rows:
+        return []
+
+    keys = np.array([getattr(row, group_by) for row in rows], dtype=object)
+    order = np.array([getattr(row, sorting_key) for row in rows])
+    values = np.array([row.error_count for row in rows])
+    starts, slopes, intercepts = group_trends(keys, order, values)
+    return list(
+        zip(keys[starts].tolist(), zip(slopes.tolist(), intercepts.tolist())),
+    )
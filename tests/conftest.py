@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The tests run against a database of their own on the configured server,
+# created and migrated at the start of the session. Set before logstack reads
+# its settings.
+os.environ["POSTGRES_DATABASE"] = os.environ.get(
+    "LOGSTACK_TEST_DATABASE",
+    "logstack_test",
+)
+os.environ["RESULT_CACHE_SIZE"] = "0"
+
+# every table the tests write to, the prefixes aside
+DATA_TABLES = (
+    "flamechart",
+    "flamechart_rollup",
+    "error_count_sketch",
+    "error_count_summary",
+    "prefix_rollup",
+    "prefix_trend_stats",
+    "prefix_diff",
+    "upload",
+    "ingestion_job",
+)
+
+
+@pytest.fixture(scope="session")
+def database():
+    from alembic.config import Config
+    from sqlalchemy import create_engine, make_url, text
+    from sqlalchemy.exc import OperationalError
+
+    from alembic import command
+    from logstack.database import engine, get_url
+    from logstack.settings import settings
+
+    admin = create_engine(
+        make_url(get_url()).set(database="postgres"),
+        isolation_level="AUTOCOMMIT",
+    )
+    name = settings.POSTGRES_DATABASE
+    try:
+        with admin.connect() as connection:
+            connection.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+            connection.execute(text(f'CREATE DATABASE "{name}"'))
+    except OperationalError as exc:
+        pytest.skip(f"no PostgreSQL server to test against: {exc}")
+    finally:
+        admin.dispose()
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    command.upgrade(config, "head")
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db(database):
+    from sqlalchemy import text
+
+    from logstack.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.execute(text(f"TRUNCATE {', '.join(DATA_TABLES)}"))
+        session.commit()
+        session.close()
@@ -0,0 +1,101 @@
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import delete, select, text
+
+from logstack.aggregates import (
+    CompactedRowsError,
+    rebuild_error_count_sketches,
+    rebuild_error_count_summaries,
+    rebuild_prefix_diffs,
+    rebuild_prefix_rollups,
+    rebuild_trend_stats,
+)
+from logstack.compaction import compact
+from logstack.controllers import get_basic_stats
+from logstack.database_models import ErrorCountSketch, FlamechartRollup
+from logstack.events import insert_events
+
+NOW = datetime.datetime(2026, 10, 18, 12)
+AGGREGATES = ("prefix_rollup", "prefix_trend_stats", "prefix_diff")
+
+
+def insert(db, created_at: datetime.datetime, count: int) -> None:
+    upload_uuid = uuid.uuid4()
+    insert_events(
+        db,
+        [
+            {
+                "upload_uuid": upload_uuid,
+                "filename": "test",
+                "from_date": created_at,
+                "to_date": created_at,
+                "created_at": created_at + datetime.timedelta(minutes=index),
+                "prefix": f"/rebuild/p{index % 3}",
+                "environment": None,
+                "error_count": index * 7 % 31,
+            }
+            for index in range(count)
+        ],
+    )
+    db.commit()
+
+
+def snapshot(db) -> list:
+    return [
+        db.execute(text(f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4")).all()
+        for table in (*AGGREGATES, "error_count_sketch", "error_count_summary")
+    ]
+
+
+def stats(db, exact: bool = False) -> list[dict]:
+    return get_basic_stats(db, "/rebuild/", quantiles=(0.9,), exact=exact)[0]
+
+
+def test_rebuilds_match_the_ingested_aggregates(db):
+    insert(db, NOW - datetime.timedelta(days=200), 60)
+    insert(db, NOW - datetime.timedelta(days=1), 30)
+    before = snapshot(db)
+
+    rebuild_prefix_rollups(db)
+    rebuild_trend_stats(db)
+    rebuild_prefix_diffs(db)
+    rebuild_error_count_sketches(db)
+    rebuild_error_count_summaries(db)
+    assert snapshot(db) == before
+
+
+def test_rebuilds_after_compaction_keep_the_folded_rows(db):
+    insert(db, NOW - datetime.timedelta(days=200), 60)
+    insert(db, NOW - datetime.timedelta(days=1), 30)
+    assert compact(db, now=NOW) > 0
+    assert db.execute(select(FlamechartRollup.id)).first() is not None
+    before, approximate, exact = snapshot(db), stats(db), stats(db, exact=True)
+
+    for rebuild in (rebuild_prefix_rollups, rebuild_trend_stats, rebuild_prefix_diffs):
+        with pytest.raises(CompactedRowsError):
+            rebuild(db)
+    rebuild_error_count_sketches(db)
+    rebuild_error_count_summaries(db)
+    assert snapshot(db) == before
+    assert stats(db) == approximate
+    assert stats(db, exact=True) == exact
+
+
+def test_sketch_rebuild_counts_rollups_without_sketches(db):
+    insert(db, NOW - datetime.timedelta(days=200), 60)
+    assert compact(db, now=NOW) > 0
+    db.execute(delete(ErrorCountSketch))
+    db.commit()
+
+    rebuild_error_count_sketches(db)
+    result = {row["prefix"]: row for row in stats(db)}
+    assert sorted(result) == ["/rebuild/p0", "/rebuild/p1", "/rebuild/p2"]
+    sketched, folded = db.execute(
+        text(
+            "SELECT (SELECT sum(row_count) FROM error_count_sketch), "
+            "(SELECT sum(row_count) FROM flamechart_rollup)",
+        ),
+    ).one()
+    assert sketched == folded == 60
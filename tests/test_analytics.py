@@ -0,0 +1,56 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from logstack.api.analytics import comparison_router
+from logstack.cache import bump_data_version
+from logstack.database import async_engine, async_read_engine
+
+URL = "/api/data/uploads_all"
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(comparison_router, prefix="/api")
+    with TestClient(app) as client:
+        yield client
+        # the pooled connections belong to the client's event loop
+        client.portal.call(async_engine.dispose)
+        client.portal.call(async_read_engine.dispose)
+
+
+def etag_of(client, **headers) -> str:
+    response = client.post(URL, json={}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["vary"] == "Accept"
+    return response.headers["etag"]
+
+
+def test_unchanged_results_are_not_modified(client):
+    etag = etag_of(client)
+
+    for if_none_match in (etag, f"W/{etag}", "*", f'"other", {etag}'):
+        response = client.post(URL, json={}, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert not response.content
+
+    response = client.post(URL, json={}, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_etag_changes_with_the_request(client):
+    etag = etag_of(client)
+    assert etag_of(client) == etag
+    assert etag_of(client, Accept="application/x-ndjson") != etag
+    assert client.post(URL, json={"page_size": 10}).headers["etag"] != etag
+
+
+def test_etag_changes_with_the_data_version(client, db):
+    etag = etag_of(client)
+    bump_data_version(db)
+
+    assert etag_of(client) != etag
+    response = client.post(URL, json={}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
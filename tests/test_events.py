@@ -0,0 +1,68 @@
+import asyncio
+import datetime
+import uuid
+
+from logstack.cache import get_data_version
+from logstack.controllers import get_basic_stats
+from logstack.database import SessionLocal, async_engine
+from logstack.events import EventBuffer, coalesce_events, insert_events
+
+CREATED_AT = datetime.datetime(2026, 10, 18, 12)
+
+
+def event(error_count: int, prefix: str = "/events/a") -> dict:
+    return {
+        "upload_uuid": uuid.UUID(int=1),
+        "filename": "event",
+        "from_date": CREATED_AT,
+        "to_date": CREATED_AT,
+        "created_at": CREATED_AT,
+        "prefix": prefix,
+        "environment": None,
+        "error_count": error_count,
+    }
+
+
+def test_coalesced_events_are_one_row_of_the_stats(db):
+    rows = [event(1), event(5, "/events/b"), event(3), event(8)]
+    merged, index = coalesce_events(rows, [row["prefix"] for row in rows])
+    assert index == [0, 1, 0, 0]
+    assert [row["error_count"] for row in merged] == [12, 5]
+
+    insert_events(db, merged)
+    [stats], _ = get_basic_stats(db, "/events/a")
+    # the total is kept, the rest are the statistics of a single row of 12
+    # rather than of 1, 3 and 8
+    assert stats["count"] == 12
+    assert (stats["mean"], stats["stddev"]) == (12, 0)
+    assert (stats["min"], stats["max"]) == (12, 12)
+
+
+def test_events_commit_with_the_data_version(db):
+    version = get_data_version(db)
+    db.commit()
+
+    insert_events(db, [event(1), event(2)])
+    other = SessionLocal()
+    try:
+        assert get_data_version(other) == version
+        db.commit()
+        assert get_data_version(other) == version + 1
+    finally:
+        other.close()
+
+
+def test_buffered_events_commit_with_the_data_version(db):
+    version = get_data_version(db)
+    db.commit()
+
+    async def write() -> list[int]:
+        buffer = EventBuffer(max_size=10, max_latency_ms=10)
+        try:
+            return await asyncio.gather(buffer.add(event(1)), buffer.add(event(2)))
+        finally:
+            await async_engine.dispose()
+
+    assert len(set(asyncio.run(write()))) == 2
+    # one flush, one version
+    assert get_data_version(db) == version + 1
@@ -0,0 +1,99 @@
+import datetime
+import io
+import os
+import uuid
+
+import pytest
+
+from logstack import jobs
+from logstack.cache import get_data_version
+from logstack.constants import JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED
+from logstack.database_models import IngestionJob
+from logstack.jobs import (
+    UploadMetadata,
+    create_job,
+    recover_interrupted_jobs,
+    run_upload_job,
+    spool_upload,
+)
+from logstack.settings import settings
+
+CONTENT = b"main;handler;query 3\nmain;handler 1\n"
+
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "INGEST_PARSE_PROCESSES", 1)
+    return tmp_path
+
+
+def queue(db) -> tuple[str, str, UploadMetadata]:
+    job_id = str(uuid.uuid4())
+    path, content_hash = spool_upload(io.BytesIO(CONTENT), job_id)
+    upload = UploadMetadata(
+        upload_uuid=str(uuid.uuid4()),
+        filename="upload.txt",
+        from_date=datetime.date(2026, 10, 17),
+        to_date=datetime.date(2026, 10, 18),
+        environment=None,
+        created_at=datetime.datetime.now(tz=datetime.UTC),
+        content_hash=content_hash,
+    )
+    create_job(db, upload, job_id)
+    return job_id, path, upload
+
+
+def status(db, job_id: str) -> IngestionJob:
+    db.expire_all()
+    return db.get(IngestionJob, job_id)
+
+
+def test_upload_job_bumps_the_version_with_the_load(db):
+    job_id, path, upload = queue(db)
+    version = get_data_version(db)
+    db.commit()
+
+    run_upload_job(job_id, path, upload)
+
+    job = status(db, job_id)
+    assert (job.status, job.rows_written) == (JOB_SUCCEEDED, 2)
+    assert get_data_version(db) == version + 1
+    assert not os.path.exists(path)
+    assert recover_interrupted_jobs() == 0
+
+
+def test_failed_upload_job_keeps_the_version(db, monkeypatch):
+    job_id, path, upload = queue(db)
+    version = get_data_version(db)
+    db.commit()
+
+    def fail(*args):
+        raise RuntimeError("no space left")
+
+    monkeypatch.setattr(jobs, "record_upload", fail)
+    run_upload_job(job_id, path, upload)
+
+    job = status(db, job_id)
+    assert (job.status, job.error) == (JOB_FAILED, "no space left")
+    assert get_data_version(db) == version
+    assert not os.path.exists(path)
+
+
+def test_recovery_fails_the_jobs_left_behind(db, spool_dir):
+    job_id, path, _upload = queue(db)
+    orphan = spool_dir / "orphan.upload"
+    orphan.write_bytes(CONTENT)
+
+    # held by this process, which is still running it
+    assert recover_interrupted_jobs() == 0
+    assert status(db, job_id).status == JOB_QUEUED
+    assert os.path.exists(path)
+
+    jobs._release_job(job_id)
+    assert recover_interrupted_jobs() == 1
+
+    job = status(db, job_id)
+    assert (job.status, job.error) == (JOB_FAILED, "interrupted by a restart")
+    assert not os.path.exists(path)
+    assert not orphan.exists()
@@ -0,0 +1,84 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from logstack.controllers import get_all_uploads
+from logstack.database_models import Upload
+from logstack.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    paginate,
+)
+
+CREATED_AT = datetime.datetime(2026, 10, 18, 12)
+
+
+def test_cursor_values_round_trip():
+    values = [
+        None,
+        True,
+        3,
+        0.5,
+        "a",
+        Decimal("1.25"),
+        CREATED_AT,
+        CREATED_AT.date(),
+        uuid.UUID(int=7),
+    ]
+    decoded = decode_cursor("test", encode_cursor("test", values))
+    assert decoded == values
+    assert [type(value) for value in decoded] == [type(value) for value in values]
+
+
+def test_cursor_of_unknown_type_is_refused():
+    with pytest.raises(TypeError):
+        encode_cursor("test", [object()])
+
+
+def test_cursor_with_values_of_the_wrong_type_is_invalid(db):
+    cursor = encode_cursor(
+        "uploads_all:errors_total:desc",
+        ["many", str(uuid.UUID(int=1))],
+    )
+    with pytest.raises(InvalidCursorError):
+        get_all_uploads(db, order_by="errors_total", cursor=cursor)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_cross_null_keys(db, descending):
+    for index, environment in enumerate(["prod", None, "dev", None, "prod", None]):
+        db.add(
+            Upload(
+                upload_uuid=uuid.UUID(int=index),
+                filename="upload",
+                environment=environment,
+                from_date=CREATED_AT,
+                to_date=CREATED_AT,
+                created_at=CREATED_AT,
+            ),
+        )
+    db.flush()
+
+    keys = [Upload.environment, Upload.upload_uuid]
+    ordered = db.query(Upload).order_by(
+        *(key.desc() if descending else key.asc() for key in keys),
+    )
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = paginate(
+            db.query(Upload),
+            keys,
+            lambda row: (row.environment, row.upload_uuid),
+            "test",
+            descending,
+            cursor,
+            page_size=2,
+        )
+        pages.extend(rows)
+        if cursor is None:
+            break
+    assert pages == ordered.all()
@@ -0,0 +1,130 @@
+import gzip
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from logstack import parsing
+from logstack.api.ingestion import ingestion_router
+from logstack.parsing import (
+    GZIP,
+    ZSTD,
+    LineTooLongError,
+    UnsupportedCompressionError,
+    detect_compression,
+    iter_lines,
+    open_decompressed,
+    parse_line,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CONTENT = b"main;handler 3\n\nmain;handler;query 12\r\nmain 1"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+needs_zstandard = pytest.mark.skipif(
+    zstandard is None,
+    reason="zstandard is not installed",
+)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(CONTENT) + 2))
+def test_lines_are_split_the_same_in_any_chunk_size(chunk_size):
+    lines = list(iter_lines(io.BytesIO(CONTENT), chunk_size, 64))
+    assert lines == [b"main;handler 3", b"", b"main;handler;query 12\r", b"main 1"]
+
+
+def test_crlf_lines_are_parsed_without_the_carriage_return():
+    lines = iter_lines(io.BytesIO(b"a;b 2\r\nc 5\r\n"), 4, 64)
+    assert [parse_line(line) for line in lines] == [("a/b", 2), ("c", 5)]
+
+
+def test_final_line_without_a_newline_is_kept():
+    assert list(iter_lines(io.BytesIO(b"a 1\nb 2"), 3, 64)) == [b"a 1", b"b 2"]
+    assert list(iter_lines(io.BytesIO(b"a 1\n"), 3, 64)) == [b"a 1"]
+
+
+def test_line_of_the_maximum_length_is_accepted():
+    assert list(iter_lines(io.BytesIO(b"abcd 1\nx 2\n"), 2, 6)) == [
+        b"abcd 1",
+        b"x 2",
+    ]
+
+
+@pytest.mark.parametrize("content", [b"a 1\nabcde 1\nb 2\n", b"a 1\nabcdefgh"])
+def test_over_long_line_is_refused(content):
+    with pytest.raises(LineTooLongError):
+        list(iter_lines(io.BytesIO(content), 3, 6))
+
+
+def compress(content: bytes, compression: str | None) -> bytes:
+    if compression == GZIP:
+        return gzip.compress(content)
+    if compression == ZSTD:
+        return zstandard.ZstdCompressor().compress(content)
+    return content
+
+
+@pytest.mark.parametrize(
+    ("head", "compression"),
+    [
+        (gzip.compress(CONTENT)[:4], GZIP),
+        pytest.param(ZSTD_MAGIC, ZSTD, marks=needs_zstandard),
+    ],
+)
+@pytest.mark.parametrize("content_type", [None, "application/octet-stream"])
+def test_compression_is_detected_from_the_magic_bytes(head, compression, content_type):
+    assert detect_compression(content_type, head) == compression
+
+
+@pytest.mark.parametrize(
+    ("content_type", "compression"),
+    [
+        ("application/gzip", GZIP),
+        pytest.param(
+            "application/x-zstd; charset=binary",
+            ZSTD,
+            marks=needs_zstandard,
+        ),
+        ("text/plain", None),
+        (None, None),
+    ],
+)
+def test_compression_falls_back_to_the_content_type(content_type, compression):
+    assert detect_compression(content_type, CONTENT[:4]) == compression
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [GZIP, pytest.param(ZSTD, marks=needs_zstandard), None],
+)
+def test_uploads_are_decompressed(tmp_path, compression):
+    path = tmp_path / "upload"
+    path.write_bytes(compress(CONTENT, compression))
+    with open_decompressed(str(path), compression) as stream:
+        assert stream.read() == CONTENT
+
+
+def test_zstd_needs_zstandard(monkeypatch):
+    monkeypatch.setattr(parsing, "zstandard", None)
+    with pytest.raises(UnsupportedCompressionError):
+        detect_compression("application/octet-stream", ZSTD_MAGIC)
+
+
+def test_unsupported_upload_is_refused_with_415(monkeypatch):
+    monkeypatch.setattr(parsing, "zstandard", None)
+    app = FastAPI()
+    app.include_router(ingestion_router, prefix="/api")
+
+    response = TestClient(app).post(
+        "/api/ingestion/upload-file",
+        params={"from_date": "2026-10-17", "to_date": "2026-10-18"},
+        files={
+            "file": ("upload.zst", ZSTD_MAGIC + CONTENT, "application/octet-stream")
+        },
+    )
+    assert response.status_code == 415
+    assert "zstandard" in response.json()["detail"]
@@ -0,0 +1,124 @@
+import datetime
+import random
+import uuid
+
+import pytest
+
+from logstack.controllers import get_basic_stats, get_basic_stats_chart
+from logstack.events import insert_events
+from logstack.sketches import RELATIVE_ACCURACY
+
+QUANTILES = (0.1, 0.25, 0.75, 0.9, 0.99)
+
+
+def samples() -> dict[str, list[int]]:
+    rng = random.Random(25)
+    return {
+        "/sketch/one": [7],
+        "/sketch/two": [10, 30],
+        "/sketch/three": [0, 5, 100],
+        "/sketch/four": [1, 2, 1000, 1001],
+        "/sketch/even": [int(rng.lognormvariate(3, 1.5)) for _ in range(40)],
+        "/sketch/odd": [rng.choice([0, 0, 3, 17, 250]) for _ in range(41)],
+        "/sketch/wide": [rng.randint(0, 10**6) for _ in range(1000)],
+    }
+
+
+def insert(
+    db,
+    values: dict[str, list[int]],
+    created_at: datetime.datetime | None = None,
+) -> None:
+    created_at = created_at or datetime.datetime.now(datetime.UTC).replace(
+        tzinfo=None,
+    )
+    upload_uuid = uuid.uuid4()
+    rows = []
+    for prefix, error_counts in values.items():
+        for index, error_count in enumerate(error_counts):
+            to_date = datetime.datetime(2026, 1, 1 + index % 3)
+            rows.append(
+                {
+                    "upload_uuid": upload_uuid,
+                    "filename": "test",
+                    "from_date": to_date,
+                    "to_date": to_date,
+                    "created_at": created_at,
+                    "prefix": prefix,
+                    "environment": None,
+                    "error_count": error_count,
+                },
+            )
+    insert_events(db, rows)
+    db.commit()
+
+
+def assert_close(approximate: dict, exact: dict) -> None:
+    # both values a quantile is interpolated between are counts, so the
+    # interpolation keeps the accuracy of the sketch
+    tolerance = pytest.approx(exact["median"], rel=RELATIVE_ACCURACY * (1 + 1e-9))
+    assert approximate["median"] == tolerance
+    assert approximate["quantiles"].keys() == exact["quantiles"].keys()
+    for quantile, value in exact["quantiles"].items():
+        assert approximate["quantiles"][quantile] == pytest.approx(
+            value,
+            rel=RELATIVE_ACCURACY * (1 + 1e-9),
+        )
+
+
+def test_sketch_quantiles_are_close_to_the_exact_ones(db):
+    insert(db, samples())
+
+    approximate, _ = get_basic_stats(db, "/sketch/", quantiles=QUANTILES)
+    exact, _ = get_basic_stats(db, "/sketch/", quantiles=QUANTILES, exact=True)
+    assert [row["prefix"] for row in approximate] == [row["prefix"] for row in exact]
+    assert len(exact) == len(samples())
+    for approximate_row, exact_row in zip(approximate, exact):
+        assert_close(approximate_row, exact_row)
+
+
+def test_sketch_median_is_interpolated(db):
+    insert(db, {"/sketch/two": [10, 30], "/sketch/four": [1, 2, 1000, 1001]})
+
+    result, _ = get_basic_stats(db, "/sketch/", order_by="median")
+    medians = {row["prefix"]: row["median"] for row in result}
+    assert medians["/sketch/two"] == pytest.approx(20, rel=RELATIVE_ACCURACY)
+    assert medians["/sketch/four"] == pytest.approx(501, rel=RELATIVE_ACCURACY)
+
+
+def test_sketch_chart_quantiles_are_close_to_the_exact_ones(db):
+    insert(db, samples())
+
+    approximate = get_basic_stats_chart(db, "/sketch/", quantiles=QUANTILES)
+    exact = get_basic_stats_chart(db, "/sketch/", quantiles=QUANTILES, exact=True)
+    assert [row["to_date"] for row in approximate] == [row["to_date"] for row in exact]
+    for approximate_row, exact_row in zip(approximate, exact):
+        assert_close(approximate_row, exact_row)
+
+
+def test_sketch_quantiles_stay_between_min_and_max(db):
+    # the values the buckets of 1 and 5 stand for are 0.99 and 5.0028
+    insert(db, {"/sketch/ones": [1] * 5, "/sketch/fives": [5] * 7})
+
+    result, _ = get_basic_stats(db, "/sketch/", quantiles=QUANTILES)
+    for row in result:
+        assert row["min"] == row["max"]
+        assert row["median"] == row["min"]
+        assert set(row["quantiles"].values()) == {row["min"]}
+
+
+def test_sketch_stats_cover_the_whole_days_of_the_range(db):
+    day = datetime.datetime(2026, 10, 10)
+    insert(db, {"/sketch/day": [1000]}, day - datetime.timedelta(hours=1))
+    insert(db, {"/sketch/day": [100, 200]}, day + datetime.timedelta(hours=6))
+    insert(db, {"/sketch/day": [1, 2]}, day + datetime.timedelta(hours=18))
+
+    [approximate], _ = get_basic_stats(
+        db,
+        "/sketch/",
+        created_after=day + datetime.timedelta(hours=12),
+    )
+    [exact], _ = get_basic_stats(db, "/sketch/", created_after=day, exact=True)
+    for statistic in ("count", "mean", "stddev", "min", "max"):
+        assert approximate[statistic] == exact[statistic]
+    assert_close(approximate, exact)